@@ -0,0 +1,190 @@
+import argparse # Para recibir la configuración de la prueba desde la terminal.
+import json # Para guardar los resultados en un archivo JSON y compararlos entre versiones.
+import logging # Para mostrar el progreso y los resultados.
+import multiprocessing # Cada caso se mide en un proceso nuevo, así la memoria máxima de uno no contamina al siguiente.
+import platform # Para apuntar en qué máquina se hizo la medida.
+import queue # Para esperar el resultado del proceso que mide sin quedarnos colgados si este falla.
+import statistics # Para calcular la mediana de las repeticiones.
+import subprocess # Para preguntar a git en qué versión del código estamos.
+import sys # Para saber en qué sistema operativo estamos.
+from datetime import datetime, timezone # Para apuntar cuándo se hizo la medida.
+
+from obtenedor_fotos import ( # Las piezas del programa que vamos a medir.
+    MAX_CONCURRENTES, ObtenedorFotos, configurar_logging, iterar_async,
+    iterar_con_hilos, iterar_con_procesos, iterar_masivo, iterar_secuencial, medir
+)
+from servidor_simulado import FOTOS_SIMULADAS, ServidorSimulado # El servidor local que sustituye a la API de verdad.
+
+MOTORES = ('secuencial', 'hilos', 'procesos', 'masivo', 'async')  # Todos los modos de ejecución que sabemos medir.
+MOTORES_CONCURRENTES = {'hilos', 'procesos', 'async'}  # Los que admiten un nivel de concurrencia; los demás se miden una sola vez por tamaño.
+TAMANOS = [100, 1000]  # Cantidades de fotos que se prueban por defecto.
+CONCURRENCIAS = [10, 50, 200]  # Niveles de concurrencia que se prueban por defecto.
+REPETICIONES = 3  # Cuántas veces se mide cada caso.
+CALENTAMIENTO = 1  # Cuántas ejecuciones se hacen antes de medir, para abrir conexiones y dejar que el limitador se ajuste.
+
+logger = logging.getLogger(__name__) # La herramienta para escribir mensajes.
+
+def crear_flujo(motor, obtenedor, tamano, concurrencia): # Prepara el flujo de resultados de un motor con la concurrencia pedida.
+    """Devuelve el flujo de resultados del motor indicado."""
+    if motor == 'secuencial':
+        return iterar_secuencial(obtenedor, tamano)
+    if motor == 'hilos': # En hilos, la concurrencia es el techo del limitador adaptativo, que ya se fijó al crear el obtenedor.
+        return iterar_con_hilos(obtenedor, tamano)
+    if motor == 'procesos': # En procesos, es el número de hilos de cada proceso.
+        return iterar_con_procesos(obtenedor, tamano, hilos_por_proceso=concurrencia)
+    if motor == 'masivo':
+        return iterar_masivo(obtenedor, tamano)
+    return iterar_async(obtenedor, tamano, concurrencia) # En async, es el número de corrutinas trabajadoras.
+
+def _medir_caso(url_base, motor, tamano, concurrencia, calentamiento, repeticiones, cola): # Se ejecuta en un proceso nuevo: calienta, mide y envía los resultados por la cola.
+    configurar_logging(logging.WARNING, archivo=None) # Dentro de la medida solo queremos ver avisos y errores, y solo en la terminal.
+    obtenedor = ObtenedorFotos(url_base=url_base, max_concurrentes=concurrencia or MAX_CONCURRENTES)
+    for _ in range(calentamiento): # Las ejecuciones de calentamiento no se apuntan.
+        medir(obtenedor, crear_flujo(motor, obtenedor, tamano, concurrencia))
+    medidas = [medir(obtenedor, crear_flujo(motor, obtenedor, tamano, concurrencia)) for _ in range(repeticiones)]
+    cola.put({'medidas': medidas, **_memoria_pico()})
+
+def _memoria_pico(): # Devuelve la memoria máxima (RSS) que ha llegado a usar este proceso y el mayor de sus hijos, en MB.
+    try:
+        import resource # Solo existe en sistemas tipo Unix.
+    except ImportError:
+        return {'rss_pico_mb': None, 'rss_pico_hijos_mb': None}
+    escala = 1 if sys.platform == 'darwin' else 1024 # En macOS viene en bytes; en Linux, en KB.
+    return {
+        'rss_pico_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * escala / 2 ** 20,
+        'rss_pico_hijos_mb': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * escala / 2 ** 20
+    }
+
+def ejecutar_caso(url_base, motor, tamano, concurrencia, calentamiento=CALENTAMIENTO, repeticiones=REPETICIONES): # Mide un caso (motor, tamaño, concurrencia) en un proceso nuevo.
+    """Mide un caso en un proceso aislado y devuelve su resumen."""
+    contexto = multiprocessing.get_context('spawn') # "spawn" arranca un intérprete limpio, sin la memoria del proceso principal.
+    cola = contexto.Queue()
+    proceso = contexto.Process(
+        target=_medir_caso,
+        args=(url_base, motor, tamano, concurrencia, calentamiento, repeticiones, cola)
+    )
+    proceso.start()
+    while True: # Esperamos el resultado, comprobando de vez en cuando que el proceso siga vivo.
+        try:
+            resultado = cola.get(timeout=1)
+            break
+        except queue.Empty:
+            if not proceso.is_alive():
+                raise RuntimeError(f"La medida de {motor} terminó sin resultados (código {proceso.exitcode})")
+    proceso.join()
+
+    medidas = resultado['medidas']
+    return {
+        'motor': motor,
+        'tamano': tamano,
+        'concurrencia': concurrencia,
+        'fotos_por_segundo': statistics.median(m['fotos_por_segundo'] for m in medidas), # De las repeticiones nos quedamos con la mediana, que no se deja llevar por una ejecución rara.
+        'tiempo': statistics.median(m['tiempo'] for m in medidas),
+        'p50': statistics.median(m['p50'] for m in medidas),
+        'p95': statistics.median(m['p95'] for m in medidas),
+        'p99': statistics.median(m['p99'] for m in medidas),
+        'errores': sum(m['errores'] for m in medidas),
+        'peticiones_fallidas': sum(m['peticiones_fallidas'] for m in medidas),
+        'rss_pico_mb': resultado['rss_pico_mb'],
+        'rss_pico_hijos_mb': resultado['rss_pico_hijos_mb'],
+        'repeticiones': medidas # Guardamos también cada repetición, por si hace falta mirar el detalle.
+    }
+
+def ejecutar_matriz(url_base, motores=MOTORES, tamanos=TAMANOS, concurrencias=CONCURRENCIAS, calentamiento=CALENTAMIENTO, repeticiones=REPETICIONES): # Mide todas las combinaciones de motor, tamaño y concurrencia.
+    """Mide cada motor para cada tamaño y nivel de concurrencia."""
+    casos = []
+    for tamano in tamanos:
+        for motor in motores:
+            for concurrencia in (concurrencias if motor in MOTORES_CONCURRENTES else [None]):
+                logger.info("Midiendo %s con %d fotos (concurrencia %s)...", motor, tamano, concurrencia or '-')
+                casos.append(ejecutar_caso(url_base, motor, tamano, concurrencia, calentamiento, repeticiones))
+    return casos
+
+def mostrar_resultados(casos): # Muestra una tabla con los resultados.
+    """Escribe en el registro una tabla con los resultados de la matriz."""
+    logger.info(
+        "%-11s%7s%7s%10s%9s%9s%9s%9s%9s",
+        'Motor', 'Fotos', 'Conc.', 'Fotos/s', 'p50 ms', 'p95 ms', 'p99 ms', 'Errores', 'RSS MB'
+    )
+    for caso in casos:
+        rss = max(caso['rss_pico_mb'] or 0, caso['rss_pico_hijos_mb'] or 0)
+        logger.info(
+            "%-11s%7d%7s%10.1f%9.1f%9.1f%9.1f%9d%9.1f",
+            caso['motor'], caso['tamano'], caso['concurrencia'] or '-', caso['fotos_por_segundo'],
+            caso['p50'] * 1000, caso['p95'] * 1000, caso['p99'] * 1000, caso['errores'], rss
+        )
+
+def _version_codigo(): # Pregunta a git en qué commit estamos, para poder comparar medidas entre versiones.
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError): # Sin git, o fuera de un repositorio.
+        return None
+
+def exportar_json(casos, ruta, configuracion): # Guarda los resultados junto con todo lo necesario para compararlos más adelante.
+    """Guarda los resultados de la matriz en un archivo JSON."""
+    informe = {
+        'fecha': datetime.now(timezone.utc).isoformat(),
+        'commit': _version_codigo(),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'nucleos': multiprocessing.cpu_count(),
+        'configuracion': configuracion,
+        'casos': casos
+    }
+    with open(ruta, 'w', encoding='utf-8') as archivo:
+        json.dump(informe, archivo, ensure_ascii=False, indent=2)
+
+def iniciar(): # La función principal cuando se ejecuta benchmark.py desde la terminal.
+    """Función principal para manejo de línea de comandos."""
+    informador = argparse.ArgumentParser(
+        description="Mide el rendimiento de los modos de ejecución contra un servidor simulado local"
+    )
+    informador.add_argument('--motores', nargs='+', choices=MOTORES, default=list(MOTORES), help="Motores a medir")
+    informador.add_argument('--tamanos', nargs='+', type=int, default=TAMANOS, help="Cantidades de fotos a probar")
+    informador.add_argument('--concurrencias', nargs='+', type=int, default=CONCURRENCIAS, help="Niveles de concurrencia a probar")
+    informador.add_argument('--repeticiones', type=int, default=REPETICIONES, help="Repeticiones medidas por caso")
+    informador.add_argument('--calentamiento', type=int, default=CALENTAMIENTO, help="Ejecuciones previas sin medir por caso")
+    informador.add_argument('--latencia', type=float, default=0.02, help="Latencia simulada por petición, en segundos")
+    informador.add_argument('--variacion', type=float, default=0.01, help="Variación máxima de la latencia simulada, en segundos")
+    informador.add_argument('--tasa-errores', type=float, default=0.0, help="Fracción de peticiones que fallan con 429/500/503")
+    informador.add_argument('--semilla', type=int, help="Semilla del azar del servidor simulado")
+    informador.add_argument('--url', help="Medir contra esta API en lugar del servidor simulado")
+    informador.add_argument('--json', help="Archivo donde guardar los resultados en JSON")
+    argumentos = informador.parse_args()
+    configurar_logging(archivo=None) # Los resultados se muestran en la terminal; no hace falta archivo de registro.
+
+    configuracion = { # Apuntamos la configuración para guardarla con los resultados.
+        'motores': argumentos.motores,
+        'tamanos': argumentos.tamanos,
+        'concurrencias': argumentos.concurrencias,
+        'repeticiones': argumentos.repeticiones,
+        'calentamiento': argumentos.calentamiento
+    }
+    if argumentos.url: # Contra una API de verdad no hay servidor que arrancar.
+        configuracion['url'] = argumentos.url
+        casos = ejecutar_matriz(argumentos.url, argumentos.motores, argumentos.tamanos, argumentos.concurrencias, argumentos.calentamiento, argumentos.repeticiones)
+    else:
+        configuracion['servidor'] = {
+            'latencia': argumentos.latencia,
+            'variacion': argumentos.variacion,
+            'tasa_errores': argumentos.tasa_errores,
+            'semilla': argumentos.semilla
+        }
+        with ServidorSimulado(
+            fotos=max(FOTOS_SIMULADAS, *argumentos.tamanos),
+            latencia=argumentos.latencia,
+            variacion=argumentos.variacion,
+            tasa_errores=argumentos.tasa_errores,
+            semilla=argumentos.semilla
+        ) as servidor:
+            casos = ejecutar_matriz(servidor.url_base, argumentos.motores, argumentos.tamanos, argumentos.concurrencias, argumentos.calentamiento, argumentos.repeticiones)
+
+    mostrar_resultados(casos)
+    if argumentos.json:
+        exportar_json(casos, argumentos.json, configuracion)
+        logger.info("Resultados guardados en %s", argumentos.json)
+
+if __name__ == '__main__':
+    iniciar()
@@ -1,141 +1,1141 @@
-import argparse # Esto nos permite que el programa reciba instrucciones cuando lo ejecutemos desde la terminal.
+# Importar este módulo tiene que ser rápido y no tocar nada: las librerías que solo usa un modo (argparse, asyncio, csv, sqlite3,
+# concurrent.futures, multiprocessing, aiohttp) se importan dentro de la función que las necesita.
+import json # Para escribir los resultados en formato JSON, una línea por foto.
 import logging # Esta librería nos ayuda a guardar registros de lo que el programa va haciendo, por si hay algún problema.
+import math # Funciones matemáticas; la usamos para redondear hacia arriba al repartir el trabajo.
+import os # Nos permite preguntar al sistema operativo cuántos núcleos tiene el ordenador.
+import random # Para elegir esperas al azar entre reintentos.
 import sys # Esta librería nos da acceso a cosas del sistema operativo, como la terminal.
+import threading # Nos da "cerrojos" para que varios hilos no toquen la misma información a la vez.
 import time # Nos permite medir el tiempo que tarda el programa en hacer cosas.
-from concurrent.futures import ThreadPoolExecutor, as_completed # Esto nos ayuda a hacer varias cosas a la vez usando "hilos" (como varios trabajadores haciendo tareas pequeñas).
-from multiprocessing import Pool # Similar a lo anterior, pero usa "procesos" que son como programas separados para hacer tareas en paralelo.
+from bisect import bisect_left # Busca rápido en una lista ordenada; lo usamos para los histogramas de latencia.
+from collections import Counter, OrderedDict, deque # Un diccionario que recuerda el orden, perfecto para saber qué álbum se usó hace más tiempo, una lista de tamaño fijo para las últimas latencias y un contador.
+from contextlib import contextmanager, nullcontext # Herramientas para abrir y cerrar cosas (como archivos) de forma ordenada.
+from datetime import datetime, timezone # Para interpretar la cabecera Retry-After cuando viene como fecha.
+from email.utils import parsedate_to_datetime # Convierte las fechas de las cabeceras HTTP en fechas de Python.
+from itertools import islice # Nos deja tomar solo los primeros elementos de una secuencia.
+from logging.handlers import QueueHandler, QueueListener # Para escribir el registro desde un hilo aparte, sin bloquear a quien escribe el mensaje.
 from requests import Session, exceptions as excepciones_requests # Esta librería nos permite hacer peticiones a páginas web (APIs en este caso) para obtener información.
+from requests.adapters import HTTPAdapter # Nos deja decidir cuántas conexiones abiertas guarda la sesión para reutilizarlas.
+from urllib3.connection import HTTPConnection, HTTPSConnection # Las conexiones que usa requests por debajo; las ampliamos para medir cuánto tardan en abrirse.
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool # Los grupos de conexiones reutilizables de requests.
+from urllib.parse import urlsplit # Separa una dirección web en sus partes, para saber a qué endpoint va cada petición.
 
 # Configuración centralizada
 URL_BASE = "https://jsonplaceholder.typicode.com" # Aquí definimos la dirección web principal de donde vamos a sacar la información. Es como la "calle" principal.
 URL_FOTOS = f"{URL_BASE}/photos" # Aquí construimos la dirección web específica para obtener información de las fotos. Es como decir "en la calle principal, la sección de fotos".
 URL_ALBUMES = f"{URL_BASE}/albums" # Igual que antes, pero para obtener información de los álbumes de fotos. "En la calle principal, la sección de álbumes".
 MAX_CONCURRENTES = 50  # Límite seguro para conexiones simultáneas. Esto dice cuántas peticiones podemos hacer a la vez sin que la página web se sature.
+LIMITE_INICIAL = 8  # Peticiones simultáneas con las que empieza el limitador adaptativo antes de ir subiendo.
+LATENCIA_OBJETIVO = 2.0  # Si el p95 de la latencia supera estos segundos, el limitador baja la concurrencia.
+VENTANA_LATENCIAS = 100  # Cuántas latencias recientes usamos para calcular el p95.
+FACTOR_REDUCCION = 0.5  # Al detectar saturación, el límite se multiplica por este valor.
+INTERVALO_REDUCCION = 1.0  # Segundos mínimos entre dos reducciones seguidas.
+REINTENTOS = 3  # Veces que repetimos una petición que falló por saturación (429, 5xx) o por tiempo agotado.
+ESPERA_BASE = 0.5  # Segundos de espera base entre reintentos; se duplica en cada intento.
+ESPERA_MAXIMA = 30  # Nunca esperamos más de estos segundos entre reintentos, aunque Retry-After pida más.
+ESTADOS_REINTENTABLES = {429, 500, 502, 503, 504}  # Códigos de respuesta que indican un problema pasajero.
+LIMITES_HISTOGRAMA = tuple(0.001 * 1.25 ** i for i in range(50))  # Límites (en segundos) de los cubos del histograma de latencias: de 1 ms a unos 55 s, cada uno un 25% mayor que el anterior.
 TIEMPO_ESPERA = 10  # Segundos para timeout de peticiones. Si tardamos más de 10 segundos en obtener una respuesta, cancelamos la petición para no quedarnos esperando indefinidamente.
 FOTOS_POR_DEFECTO = 5000  # Valor de respaldo si no se obtiene el total. Si por alguna razón no podemos saber cuántas fotos hay en total, usamos este número como referencia.
+CONCURRENCIA_ASYNC = 200  # Peticiones simultáneas por defecto en el modo async. Como no usa hilos, puede ser mucho mayor que MAX_CONCURRENTES.
+HILOS_POR_PROCESO = 16  # En el modo procesos, cada proceso usa además este número de hilos para esperar a la red. En total: núcleos × hilos.
+BLOQUES_POR_PROCESO = 4  # En cuántos bloques por proceso partimos las fotos. Más de uno permite que un proceso rápido ayude a uno lento.
+LOTE_MAXIMO = 500  # Fotos como máximo por bloque del modo procesos: con muchas fotos se hacen más bloques, no más grandes, y la memoria no crece.
+TAMANO_BUFFER_SALIDA = 1 << 16  # Bytes que acumulamos antes de escribir en el archivo de salida (64 KB).
+LOTE_PROGRESO = 500  # Cada cuántos resultados guardamos definitivamente el progreso en el disco.
+TAMANO_CACHE_ALBUMES = 128  # Cuántos álbumes recordamos como máximo. La API tiene 100, así que caben todos.
+TTL_CACHE_ALBUMES = 300  # Segundos que un álbum guardado se considera válido antes de volver a pedirlo.
+INTERVALO_PROGRESO = 0.5  # Segundos entre dos actualizaciones de la línea de progreso en vivo.
+ARCHIVO_LOG = 'obtenedor_fotos.log'  # Archivo donde iniciar() guarda el registro, además de mostrarlo en la terminal.
+FORMATO_LOG = '%(asctime)s - %(levelname)s - %(message)s'  # Cada línea del registro: la fecha y hora, el tipo de mensaje (INFO, ERROR, etc.) y el mensaje en sí.
 
-# Configuración inicial del logging
-logging.basicConfig( # Aquí configuramos cómo queremos que se guarden los registros del programa.
-    level=logging.INFO, # Indicamos que queremos guardar información importante (INFO), advertencias (WARNING) y errores (ERROR).
-    format='%(asctime)s - %(levelname)s - %(message)s', # Definimos cómo se va a mostrar cada línea del registro: la fecha y hora, el tipo de mensaje (INFO, ERROR, etc.) y el mensaje en sí.
-    handlers=[ # Aquí decimos dónde queremos guardar esos registros.
-        logging.StreamHandler(sys.stdout), # Queremos que los mensajes importantes se muestren también en la pantalla (la terminal).
-        logging.FileHandler('obtenedor_fotos.log') # Y también queremos que se guarden en un archivo llamado 'obtenedor_fotos.log' para poder revisarlos después.
-    ]
-)
-logger = logging.getLogger(__name__) # Creamos una herramienta para poder escribir esos registros.
+logger = logging.getLogger(__name__) # Creamos una herramienta para poder escribir registros.
+logger.addHandler(logging.NullHandler()) # Al importarnos como librería no decidimos adónde van los mensajes: eso lo hace quien nos usa, o configurar_logging() desde iniciar().
+_escuchador_logging = None # El hilo que escribe el registro, si configurar_logging() ya se llamó.
+
+class _ManejadorCola(QueueHandler): # Deja cada mensaje en una cola sin darle formato: el formato y la escritura los hace el hilo del escuchador.
+    def prepare(self, record): # El QueueHandler normal formatea aquí el mensaje, en el hilo que lo escribe. Dentro del mismo proceso no hace falta.
+        return record
+
+def configurar_logging(nivel=logging.INFO, archivo=ARCHIVO_LOG): # Manda el registro a la terminal (y a un archivo) desde un hilo aparte, para que escribir no frene las peticiones.
+    """Configura el registro raíz con una cola y un hilo escritor; devuelve el QueueListener."""
+    global _escuchador_logging
+    import atexit # Solo hace falta al configurar el registro.
+    import queue
+    _detener_logging() # Si ya estaba configurado, cerramos la configuración anterior.
+    formato = logging.Formatter(FORMATO_LOG)
+    destinos = [logging.StreamHandler(sys.stdout)] # Los mensajes se muestran en la terminal...
+    if archivo: # ...y, si se pide, también se guardan en un archivo.
+        destinos.append(logging.FileHandler(archivo, encoding='utf-8'))
+    for destino in destinos:
+        destino.setFormatter(formato)
+    cola = queue.SimpleQueue() # La cola entre los hilos que escriben mensajes y el que los saca.
+    raiz = logging.getLogger()
+    raiz.handlers[:] = [_ManejadorCola(cola)] # Cualquier mensaje (nuestro o de otras librerías) pasa por la cola.
+    raiz.setLevel(nivel)
+    _escuchador_logging = QueueListener(cola, *destinos)
+    _escuchador_logging.start()
+    atexit.register(_detener_logging) # Al salir del programa, escribimos lo que quede en la cola.
+    return _escuchador_logging
+
+def _detener_logging(): # Vacía la cola, para el hilo escritor y cierra sus destinos (por ejemplo, el archivo).
+    global _escuchador_logging
+    if _escuchador_logging is None:
+        return
+    raiz = logging.getLogger()
+    for manejador in raiz.handlers[:]: # Los mensajes dejan de ir a la cola...
+        if isinstance(manejador, _ManejadorCola):
+            raiz.removeHandler(manejador)
+    _escuchador_logging.stop() # ...y se escriben los que quedaban en ella.
+    for destino in _escuchador_logging.handlers:
+        destino.close()
+    _escuchador_logging = None
+
+class CacheAlbumes: # Una "memoria" para los álbumes: hay 5000 fotos pero solo 100 álbumes, así que no tiene sentido pedir el mismo álbum una y otra vez.
+    """Caché LRU con caducidad que agrupa las peticiones simultáneas a un mismo álbum."""
+
+    def __init__(self, tamano_maximo=TAMANO_CACHE_ALBUMES, ttl=TTL_CACHE_ALBUMES): # Al crear la caché decidimos cuántos álbumes caben y cuánto tiempo duran.
+        self.tamano_maximo = tamano_maximo # Número máximo de álbumes guardados. Si se supera, se tira el que lleva más tiempo sin usarse (LRU).
+        self.ttl = ttl # Segundos que dura cada álbum guardado antes de caducar.
+        self.aciertos = 0 # Veces que el álbum ya estaba guardado y nos ahorramos la petición.
+        self.fallos = 0 # Veces que no estaba y hubo que pedirlo a la API.
+        self.agrupadas = 0 # Veces que otro hilo ya lo estaba pidiendo y simplemente esperamos su respuesta.
+        self._entradas = OrderedDict() # Aquí guardamos los álbumes: clave -> (momento en que caduca, álbum).
+        self._en_curso = {} # Peticiones que se están haciendo ahora mismo: clave -> "futuro" con la respuesta que llegará.
+        self._en_curso_async = {} # Lo mismo, pero para el modo async: clave -> tarea de asyncio.
+        self._cerrojo = threading.Lock() # El cerrojo que evita que dos hilos modifiquen la caché a la vez.
+
+    def obtener(self, clave, cargar): # Devuelve el álbum de la caché o, si no está, lo carga usando la función "cargar".
+        """Devuelve el valor de la clave, cargándolo una sola vez aunque lo pidan muchos hilos."""
+        with self._cerrojo: # Solo un hilo a la vez puede mirar y tocar la caché.
+            entrada = self._entradas.get(clave) # Buscamos si ya tenemos este álbum guardado.
+            if entrada is not None and entrada[0] > time.monotonic(): # Si está guardado y todavía no ha caducado...
+                self._entradas.move_to_end(clave) # ...lo marcamos como el más recientemente usado...
+                self.aciertos += 1 # ...contamos un acierto...
+                return entrada[1] # ...y lo devolvemos sin hacer ninguna petición.
+            if entrada is not None: # Si estaba guardado pero ya caducó, lo quitamos.
+                del self._entradas[clave]
+            futuro = self._en_curso.get(clave) # ¿Hay otro hilo pidiendo este mismo álbum ahora mismo?
+            es_lider = futuro is None # Si nadie lo está pidiendo, nosotros seremos los encargados ("líder") de pedirlo.
+            if es_lider: # Somos el primero en pedirlo.
+                from concurrent.futures import Future # Solo se necesita cuando el álbum no está en la caché.
+                self.fallos += 1 # Contamos un fallo de caché.
+                futuro = Future() # Creamos un "futuro" donde dejaremos la respuesta para los demás hilos.
+                self._en_curso[clave] = futuro # Y avisamos de que ya hay una petición en marcha para esta clave.
+            else: # Otro hilo ya lo está pidiendo.
+                self.agrupadas += 1 # Contamos una petición que nos hemos ahorrado por agruparla.
+
+        if not es_lider: # Si no somos el líder, simplemente esperamos a que el líder termine.
+            return futuro.result() # Si el líder tuvo un error, aquí se vuelve a lanzar el mismo error.
+
+        try: # Somos el líder: hacemos la petición fuera del cerrojo para no bloquear al resto de álbumes.
+            valor = cargar(clave) # Pedimos el álbum a la API.
+        except BaseException as e: # Si algo falla, no guardamos nada en la caché...
+            with self._cerrojo:
+                del self._en_curso[clave] # ...quitamos la petición en curso para que otro pueda reintentarlo...
+            futuro.set_exception(e) # ...avisamos del error a los hilos que esperaban...
+            raise # ...y lo lanzamos también para quien nos llamó.
+
+        with self._cerrojo: # Todo fue bien: guardamos el álbum y marcamos la petición como terminada.
+            self._guardar(clave, valor)
+            del self._en_curso[clave]
+        futuro.set_result(valor) # Despertamos a los hilos que esperaban este álbum.
+        return valor
+
+    async def obtener_async(self, clave, cargar): # Igual que "obtener", pero para el modo async: "cargar" es una función asíncrona.
+        """Versión asíncrona de obtener: una sola tarea por clave aunque la pidan muchas corrutinas."""
+        import asyncio # Si estamos aquí, asyncio ya está cargado; esto solo lo busca.
+        with self._cerrojo: # El cerrojo protege la caché por si también la usan hilos a la vez.
+            entrada = self._entradas.get(clave) # Buscamos si ya tenemos este álbum guardado.
+            if entrada is not None and entrada[0] > time.monotonic(): # Si está guardado y no ha caducado, lo devolvemos al momento.
+                self._entradas.move_to_end(clave)
+                self.aciertos += 1
+                return entrada[1]
+            tarea = self._en_curso_async.get(clave) # ¿Alguna otra corrutina lo está pidiendo ya?
+            if tarea is None: # No: creamos la tarea que lo pedirá.
+                self.fallos += 1
+                tarea = asyncio.ensure_future(cargar(clave)) # La tarea empieza a ejecutarse en cuanto soltemos el control.
+                self._en_curso_async[clave] = tarea
+                tarea.add_done_callback(lambda t: self._terminar_async(clave, t)) # Cuando termine, guardaremos el resultado en la caché.
+            else: # Sí: nos ahorramos la petición y esperamos la suya.
+                self.agrupadas += 1
+        return await asyncio.shield(tarea) # "shield" evita que, si cancelan a una corrutina, se cancele la petición que esperan las demás.
+
+    async def cancelar_async(self): # Cancela las peticiones de álbumes que sigan en curso. "shield" las protege de la cancelación de los trabajadores, así que hay que hacerlo a mano antes de cerrar el bucle.
+        """Cancela y espera las cargas asíncronas en curso."""
+        import asyncio
+        with self._cerrojo:
+            tareas = list(self._en_curso_async.values())
+            self._en_curso_async.clear() # Así la siguiente ejecución, con otro bucle, no espera tareas de este.
+        for tarea in tareas:
+            tarea.cancel()
+        await asyncio.gather(*tareas, return_exceptions=True)
+
+    def _terminar_async(self, clave, tarea): # Se llama automáticamente cuando termina una tarea de "obtener_async".
+        with self._cerrojo:
+            if self._en_curso_async.get(clave) is tarea: # La petición ya no está en curso (si la cancelamos, ya la quitó cancelar_async).
+                del self._en_curso_async[clave]
+            if not tarea.cancelled() and tarea.exception() is None: # Solo guardamos el álbum si la petición fue bien.
+                self._guardar(clave, tarea.result())
+
+    def guardar(self, clave, valor): # Permite meter un álbum en la caché directamente, sin pedirlo.
+        """Guarda un valor en la caché."""
+        with self._cerrojo:
+            self._guardar(clave, valor)
+
+    def _guardar(self, clave, valor): # Versión interna de "guardar"; quien la llama ya tiene el cerrojo.
+        if self.tamano_maximo <= 0: # Si la caché tiene tamaño cero, está desactivada y no guardamos nada.
+            return
+        self._entradas[clave] = (time.monotonic() + self.ttl, valor) # Guardamos el álbum junto con el momento en que caducará.
+        self._entradas.move_to_end(clave) # Lo marcamos como el más reciente.
+        while len(self._entradas) > self.tamano_maximo: # Si nos pasamos del tamaño máximo...
+            self._entradas.popitem(last=False) # ...tiramos el que lleva más tiempo sin usarse.
+
+    def limpiar(self): # Vacía la caché por completo.
+        """Elimina todas las entradas guardadas."""
+        with self._cerrojo:
+            self._entradas.clear()
+
+    def estadisticas(self): # Devuelve los contadores de la caché en un diccionario.
+        """Devuelve los contadores de aciertos, fallos y peticiones agrupadas."""
+        with self._cerrojo:
+            return {
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'agrupadas': self.agrupadas,
+                'entradas': len(self._entradas)
+            }
+
+    def __getstate__(self): # Los cerrojos no se pueden copiar a otro proceso, así que los quitamos al "empaquetar" la caché.
+        estado = self.__dict__.copy()
+        del estado['_cerrojo']
+        estado['_en_curso'] = {} # Las peticiones en curso solo tienen sentido en el proceso original.
+        estado['_en_curso_async'] = {}
+        return estado
+
+    def __setstate__(self, estado): # Al "desempaquetar" la caché en otro proceso, le damos un cerrojo nuevo.
+        self.__dict__.update(estado)
+        self._cerrojo = threading.Lock()
+
+class LimitadorAdaptativo: # Un "semáforo inteligente": decide cuántas peticiones pueden ir a la vez y ajusta ese número según responda la API.
+    """Limitador de concurrencia AIMD guiado por errores y por el p95 de la latencia."""
+
+    def __init__(self, maximo=MAX_CONCURRENTES, minimo=1, inicial=LIMITE_INICIAL, latencia_objetivo=LATENCIA_OBJETIVO): # Al crearlo decidimos entre qué valores se puede mover el límite.
+        self.maximo = maximo # Nunca dejaremos más peticiones a la vez que esto.
+        self.minimo = minimo # Ni menos que esto.
+        self.limite = float(max(minimo, min(inicial, maximo))) # El límite actual; es decimal porque sube poco a poco.
+        self.latencia_objetivo = latencia_objetivo # Si el p95 de la latencia supera estos segundos, consideramos que la API está saturada.
+        self.reducciones = 0 # Cuántas veces hemos tenido que bajar el límite.
+        self._latencias = deque(maxlen=VENTANA_LATENCIAS) # Las latencias de las últimas peticiones, para calcular el p95.
+        self._en_curso = 0 # Peticiones que están en marcha ahora mismo.
+        self._ultima_reduccion = 0.0 # Momento de la última bajada, para no bajar muchas veces por la misma racha de errores.
+        self._condicion = threading.Condition() # Un cerrojo con "timbre": los hilos esperan aquí hasta que haya hueco.
+
+    def adquirir(self): # Se llama antes de cada petición. Si no hay hueco, el hilo espera.
+        """Espera hasta que haya hueco para una petición más."""
+        with self._condicion:
+            while self._en_curso >= int(self.limite): # Mientras estemos en el límite...
+                self._condicion.wait() # ...esperamos a que otra petición termine.
+            self._en_curso += 1
+
+    def liberar(self, latencia, sobrecarga=False): # Se llama al terminar cada petición, con lo que tardó y si la API parecía saturada.
+        """Libera el hueco de una petición y ajusta el límite según su resultado."""
+        with self._condicion:
+            self._en_curso -= 1
+            if sobrecarga: # Error 429/5xx o tiempo agotado: la API no da más de sí.
+                self._reducir()
+            else:
+                self._latencias.append(latencia)
+                if self._percentil_95() > self.latencia_objetivo: # Responde, pero cada vez más lenta: también es señal de saturación.
+                    self._reducir()
+                elif self.reducciones == 0: # Mientras no haya habido problemas, subimos rápido (el límite se duplica en cada ronda).
+                    self.limite = min(self.maximo, self.limite + 1)
+                else: # Después, subimos despacio: una petición más por cada ronda completa.
+                    self.limite = min(self.maximo, self.limite + 1 / self.limite)
+            self._condicion.notify_all() # Avisamos a los hilos que esperaban: puede que ahora haya hueco.
+
+    def _reducir(self): # Baja el límite a la mitad, como mucho una vez por intervalo. Quien la llama ya tiene el cerrojo.
+        ahora = time.monotonic()
+        if ahora - self._ultima_reduccion < INTERVALO_REDUCCION: # Una racha de errores seguidos cuenta como un solo aviso.
+            return
+        self._ultima_reduccion = ahora
+        self.reducciones += 1
+        self.limite = max(self.minimo, self.limite * FACTOR_REDUCCION)
+        self._latencias.clear() # Empezamos a medir de nuevo con el límite nuevo.
+        logger.debug("Concurrencia reducida a %d", self.limite)
+
+    def _percentil_95(self): # Calcula la latencia por debajo de la cual está el 95% de las últimas peticiones.
+        if len(self._latencias) < VENTANA_LATENCIAS // 5: # Con muy pocas medidas, el p95 no es fiable.
+            return 0.0
+        ordenadas = sorted(self._latencias)
+        return ordenadas[int(len(ordenadas) * 0.95) - 1]
+
+    def __getstate__(self): # El "timbre" no se puede copiar a otro proceso, así que lo quitamos al empaquetar.
+        estado = self.__dict__.copy()
+        del estado['_condicion']
+        estado['_en_curso'] = 0
+        return estado
+
+    def __setstate__(self, estado): # Y al desempaquetar le damos uno nuevo.
+        self.__dict__.update(estado)
+        self._condicion = threading.Condition()
+
+def _calcular_espera(intento, retry_after=None): # Decide cuánto esperar antes de reintentar una petición.
+    """Devuelve los segundos de espera antes de un reintento, respetando Retry-After."""
+    if retry_after: # Si la API nos dice cuánto esperar (cabecera Retry-After), le hacemos caso.
+        try:
+            espera = float(retry_after) # Puede venir en segundos...
+        except ValueError:
+            try:
+                espera = (parsedate_to_datetime(retry_after) - datetime.now(timezone.utc)).total_seconds() # ...o como una fecha.
+            except (TypeError, ValueError): # Si no entendemos la cabecera, la ignoramos.
+                espera = None
+        if espera is not None:
+            return min(max(espera, 0.0), ESPERA_MAXIMA)
+    return random.uniform(0, min(ESPERA_MAXIMA, ESPERA_BASE * 2 ** intento)) # Si no, esperamos un tiempo al azar que se duplica en cada intento, para que los hilos no reintenten todos a la vez.
+
+class Metricas: # Aquí apuntamos cuánto tarda cada petición y qué respondió la API, separado por endpoint (photos, albums...).
+    """Histogramas de latencia y contadores de las peticiones, combinables entre procesos."""
+
+    def __init__(self): # Empezamos con todo a cero.
+        self.estados = Counter() # Cuántas peticiones terminaron con cada estado: (endpoint, código HTTP o 'error') -> número.
+        self.histogramas = {} # Para cada endpoint, cuántas peticiones cayeron en cada "cubo" de latencia.
+        self.sumas = Counter() # Para cada endpoint, la suma de todas sus latencias (para calcular la media).
+        self.fases = {} # Lo mismo, pero para cada fase de una petición: 'dns', 'conexion', 'respuesta' (hasta las cabeceras) y 'json' (decodificar). Con requests no se ve el DNS por separado, así que va dentro de 'conexion'.
+        self.sumas_fases = Counter() # La suma de duraciones de cada fase.
+        self.contadores = Counter() # Otros contadores: (nombre, endpoint) -> cantidad. Por ejemplo ('bytes', 'photos') o ('reintentos', 'albums').
+        self._cerrojo = threading.Lock() # Varios hilos apuntan a la vez, así que protegemos los contadores.
+
+    def registrar(self, endpoint, latencia, estado, bytes_recibidos=0): # Apunta una petición: su endpoint, lo que tardó, el código que devolvió y cuánto ocupaba la respuesta.
+        """Registra una petición HTTP terminada."""
+        with self._cerrojo:
+            _anadir_a_histograma(self.histogramas, endpoint, latencia)
+            self.sumas[endpoint] += latencia
+            self.estados[(endpoint, estado)] += 1
+            if bytes_recibidos:
+                self.contadores[('bytes', endpoint)] += bytes_recibidos
+
+    def registrar_fase(self, fase, duracion): # Apunta lo que tardó una fase concreta de una petición.
+        """Registra la duración de una fase de una petición."""
+        with self._cerrojo:
+            _anadir_a_histograma(self.fases, fase, duracion)
+            self.sumas_fases[fase] += duracion
+
+    def contar(self, nombre, endpoint=None, cantidad=1): # Suma a uno de los contadores generales.
+        """Incrementa un contador, opcionalmente por endpoint."""
+        with self._cerrojo:
+            self.contadores[(nombre, endpoint)] += cantidad
+
+    def combinar(self, otras): # Suma a estas métricas las de otro sitio (por ejemplo, las de un proceso trabajador).
+        """Acumula otras métricas sobre estas."""
+        with self._cerrojo:
+            for propios, ajenos in ((self.histogramas, otras.histogramas), (self.fases, otras.fases)):
+                for nombre, histograma in ajenos.items():
+                    destino = propios.setdefault(nombre, [0] * len(histograma))
+                    for cubo, cuenta in enumerate(histograma):
+                        destino[cubo] += cuenta
+            self.sumas.update(otras.sumas)
+            self.sumas_fases.update(otras.sumas_fases)
+            self.estados.update(otras.estados)
+            self.contadores.update(otras.contadores)
+
+    def extraer(self): # Devuelve una copia de lo acumulado y deja estas métricas a cero. La usan los procesos para enviar lo suyo.
+        """Devuelve las métricas acumuladas y las reinicia."""
+        copia = Metricas()
+        with self._cerrojo:
+            for atributo in ('estados', 'histogramas', 'sumas', 'fases', 'sumas_fases', 'contadores'):
+                setattr(copia, atributo, getattr(self, atributo))
+                setattr(self, atributo, type(getattr(self, atributo))())
+        return copia
+
+    def total(self, endpoint=None): # Número de peticiones, de un endpoint o de todos.
+        """Devuelve el número de peticiones registradas."""
+        return sum(n for (nombre, _), n in self.estados.items() if endpoint in (None, nombre))
+
+    def errores(self, endpoint=None): # Peticiones que no terminaron con un código 2xx (incluidas las que no llegaron a tener respuesta).
+        """Devuelve el número de peticiones sin respuesta correcta."""
+        return sum(
+            n for (nombre, estado), n in self.estados.items()
+            if endpoint in (None, nombre) and not (isinstance(estado, int) and 200 <= estado < 300)
+        )
+
+    def contador(self, nombre, endpoint=None): # Lee un contador general; sin endpoint, suma todos los endpoints.
+        """Devuelve el valor de un contador, de un endpoint o sumado."""
+        return sum(n for (clave, ep), n in self.contadores.items() if clave == nombre and endpoint in (None, ep))
+
+    def percentil(self, p, endpoint=None): # Devuelve la latencia por debajo de la cual está la fracción p (0.95 = p95) de las peticiones.
+        """Estima un percentil de latencia a partir de los histogramas."""
+        with self._cerrojo:
+            histogramas = [h for nombre, h in self.histogramas.items() if endpoint in (None, nombre)]
+        return _percentil(histogramas, p)
+
+    def percentil_fase(self, p, fase): # Lo mismo, para una fase concreta.
+        """Estima un percentil de la duración de una fase."""
+        with self._cerrojo:
+            histogramas = [self.fases[fase]] if fase in self.fases else []
+        return _percentil(histogramas, p)
+
+    def resumen(self): # Un diccionario con lo más importante, listo para mostrar o guardar en JSON.
+        """Devuelve un resumen con peticiones, errores, percentiles, fases y conexiones."""
+        def resumir(endpoint=None):
+            return {
+                'peticiones': self.total(endpoint),
+                'errores': self.errores(endpoint),
+                'reintentos': self.contador('reintentos', endpoint),
+                'bytes': self.contador('bytes', endpoint),
+                'p50': self.percentil(0.50, endpoint),
+                'p95': self.percentil(0.95, endpoint),
+                'p99': self.percentil(0.99, endpoint)
+            }
+        resumen = resumir()
+        nuevas = self.contador('conexiones_nuevas')
+        respondidas = sum(n for (_, estado), n in self.estados.items() if isinstance(estado, int)) # Solo las peticiones que recibieron respuesta llegaron a tener conexión.
+        resumen['conexiones'] = {
+            'nuevas': nuevas,
+            'reutilizadas': max(0, respondidas - nuevas), # Cada petición respondida que no abrió conexión reutilizó una.
+            'fallidas': self.contador('conexiones_fallidas') # Intentos de conexión que no llegaron a abrirse.
+        }
+        resumen['endpoints'] = {endpoint: resumir(endpoint) for endpoint in sorted(self.histogramas)}
+        resumen['fases'] = {
+            fase: {'p50': self.percentil_fase(0.50, fase), 'p95': self.percentil_fase(0.95, fase), 'total': self.sumas_fases[fase]}
+            for fase in sorted(self.fases)
+        }
+        return resumen
+
+    def prometheus(self, prefijo='obtenedor_fotos'): # Escribe todas las métricas en el formato de texto de Prometheus.
+        """Devuelve las métricas en el formato de exposición de texto de Prometheus."""
+        lineas = [
+            f"# HELP {prefijo}_peticiones_total Peticiones HTTP por endpoint y estado.",
+            f"# TYPE {prefijo}_peticiones_total counter"
+        ]
+        for (endpoint, estado), n in sorted(self.estados.items(), key=str):
+            lineas.append(f'{prefijo}_peticiones_total{{endpoint="{endpoint}",estado="{estado}"}} {n}')
+        for nombre, ayuda in (('bytes', "Bytes recibidos en el cuerpo de las respuestas."), ('reintentos', "Reintentos por fallos pasajeros.")):
+            lineas += [f"# HELP {prefijo}_{nombre}_total {ayuda}", f"# TYPE {prefijo}_{nombre}_total counter"]
+            for endpoint in sorted(self.histogramas):
+                lineas.append(f'{prefijo}_{nombre}_total{{endpoint="{endpoint}"}} {self.contador(nombre, endpoint)}')
+        resumen = self.resumen()['conexiones']
+        lineas += [f"# HELP {prefijo}_conexiones_total Conexiones abiertas, reutilizadas y fallidas.", f"# TYPE {prefijo}_conexiones_total counter"]
+        lineas += [f'{prefijo}_conexiones_total{{tipo="{tipo}"}} {n}' for tipo, n in resumen.items()]
+        with self._cerrojo:
+            for nombre, ayuda, etiqueta, histogramas, sumas in (
+                ('latencia_segundos', "Latencia de cada petición HTTP.", 'endpoint', self.histogramas, self.sumas),
+                ('fase_segundos', "Duración de cada fase de las peticiones.", 'fase', self.fases, self.sumas_fases)
+            ):
+                lineas += [f"# HELP {prefijo}_{nombre} {ayuda}", f"# TYPE {prefijo}_{nombre} histogram"]
+                for clave, histograma in sorted(histogramas.items()):
+                    acumulado = 0
+                    for limite, cuenta in zip(LIMITES_HISTOGRAMA, histograma): # Prometheus usa cubos acumulados: "cuántas por debajo de este límite".
+                        acumulado += cuenta
+                        lineas.append(f'{prefijo}_{nombre}_bucket{{{etiqueta}="{clave}",le="{limite:.6g}"}} {acumulado}')
+                    acumulado += histograma[-1]
+                    lineas.append(f'{prefijo}_{nombre}_bucket{{{etiqueta}="{clave}",le="+Inf"}} {acumulado}')
+                    lineas.append(f'{prefijo}_{nombre}_sum{{{etiqueta}="{clave}"}} {sumas[clave]:.6f}')
+                    lineas.append(f'{prefijo}_{nombre}_count{{{etiqueta}="{clave}"}} {acumulado}')
+        return '\n'.join(lineas) + '\n'
+
+    def __getstate__(self): # El cerrojo no se puede enviar a otro proceso.
+        estado = self.__dict__.copy()
+        del estado['_cerrojo']
+        return estado
+
+    def __setstate__(self, estado):
+        self.__dict__.update(estado)
+        self._cerrojo = threading.Lock()
+
+def _anadir_a_histograma(histogramas, clave, valor): # Suma uno al cubo que corresponde al valor. Quien la llama ya tiene el cerrojo.
+    histograma = histogramas.setdefault(clave, [0] * (len(LIMITES_HISTOGRAMA) + 1)) # El último cubo es para lo que supere el mayor límite.
+    histograma[bisect_left(LIMITES_HISTOGRAMA, valor)] += 1 # Buscamos en qué cubo cae (sin recorrerlos todos).
+
+def _percentil(histogramas, p): # Calcula un percentil juntando varios histogramas.
+    cuentas = [sum(cubo) for cubo in zip(*histogramas)]
+    total = sum(cuentas)
+    if not total: # Sin datos no hay percentil.
+        return 0.0
+    objetivo = p * total # Cuántas medidas tienen que quedar por debajo.
+    acumulado = 0
+    for cubo, cuenta in enumerate(cuentas): # Recorremos los cubos hasta alcanzar el objetivo...
+        if cuenta and acumulado + cuenta >= objetivo:
+            inferior = LIMITES_HISTOGRAMA[cubo - 1] if cubo else 0.0
+            superior = LIMITES_HISTOGRAMA[min(cubo, len(LIMITES_HISTOGRAMA) - 1)]
+            return inferior + (superior - inferior) * (objetivo - acumulado) / cuenta # ...y repartimos dentro del cubo de forma lineal.
+        acumulado += cuenta
+    return LIMITES_HISTOGRAMA[-1]
+
+def _endpoint(url): # Saca el nombre del endpoint de una dirección: ".../photos/7" y ".../photos" son los dos "photos".
+    partes = urlsplit(url).path.rstrip('/').split('/')
+    return partes[-2] if partes[-1].isdigit() and len(partes) > 1 else partes[-1]
+
+class _AdaptadorMedido(HTTPAdapter): # El adaptador de requests, pero apuntando en las métricas cada conexión nueva y lo que tarda en abrirse.
+    """Adaptador HTTP que registra en las métricas la apertura de conexiones."""
+    __attrs__ = HTTPAdapter.__attrs__ + ['metricas'] # Al copiarlo a otro proceso, las métricas viajan con él.
+
+    def __init__(self, metricas, **opciones):
+        self.metricas = metricas # Dónde apuntar las conexiones.
+        super().__init__(**opciones)
+
+    def init_poolmanager(self, *args, **opciones): # requests llama a esto al crear el adaptador; aquí cambiamos las clases de conexión por las nuestras.
+        super().init_poolmanager(*args, **opciones)
+        metricas = self.metricas
+
+        def medir(conectar): # Abre la conexión apuntando lo que tarda, o que falló.
+            inicio = time.perf_counter()
+            try:
+                conectar()
+            except Exception:
+                metricas.contar('conexiones_fallidas')
+                raise
+            metricas.registrar_fase('conexion', time.perf_counter() - inicio)
+            metricas.contar('conexiones_nuevas')
+
+        class ConexionHTTP(HTTPConnection):
+            def connect(self): # Abrir la conexión incluye resolver el nombre (DNS) y conectar por TCP; urllib3 no deja medir el DNS aparte.
+                medir(super().connect)
+
+        class ConexionHTTPS(HTTPSConnection):
+            def connect(self): # Aquí, además, la negociación TLS.
+                medir(super().connect)
+
+        class GrupoHTTP(HTTPConnectionPool):
+            ConnectionCls = ConexionHTTP
+
+        class GrupoHTTPS(HTTPSConnectionPool):
+            ConnectionCls = ConexionHTTPS
+
+        self.poolmanager.pool_classes_by_scheme = {'http': GrupoHTTP, 'https': GrupoHTTPS}
 
 class ObtenedorFotos: # Creamos una "clase", que es como un molde para crear objetos que nos ayudarán a obtener las fotos.
-    def __init__(self): # Este es un "constructor", que se ejecuta automáticamente cuando creamos un objeto de la clase ObtenedorFotos.
+    def __init__(self, tamano_cache=TAMANO_CACHE_ALBUMES, ttl_cache=TTL_CACHE_ALBUMES, max_concurrentes=MAX_CONCURRENTES, url_base=URL_BASE): # Este es un "constructor", que se ejecuta automáticamente cuando creamos un objeto de la clase ObtenedorFotos.
+        self.url_base = url_base # La dirección de la API. Se puede cambiar, por ejemplo, para usar el servidor simulado de las pruebas.
+        self.url_fotos = f"{url_base}/photos" # La sección de fotos de esa API.
+        self.url_albumes = f"{url_base}/albums" # Y la de álbumes.
         self.sesion = Session() # Creamos una "sesión" para poder hacer varias peticiones a la misma página web de forma más eficiente. Es como abrir un navegador web.
         self.sesion.headers.update({'User-Agent': 'ObtenedorFotos/1.0'}) # Le decimos a la página web quiénes somos para que nos identifique. Es como decir "hola, soy el programa ObtenedorFotos versión 1.0".
+        self.metricas = Metricas() # Aquí se apunta cuánto tarda cada petición, qué responde la API y cuántas conexiones se abren.
+        adaptador = _AdaptadorMedido(self.metricas, pool_maxsize=max_concurrentes) # Por defecto la sesión solo guarda 10 conexiones abiertas; con 50 hilos, el resto tendría que abrir una conexión nueva cada vez.
+        self.sesion.mount('https://', adaptador) # Usamos ese adaptador para las direcciones seguras...
+        self.sesion.mount('http://', adaptador) # ...y para las normales.
+        self.cache_albumes = CacheAlbumes(tamano_cache, ttl_cache) # Creamos la caché de álbumes para no pedir el mismo álbum miles de veces.
+        self.limitador = LimitadorAdaptativo(max_concurrentes) # Y el limitador que decide cuántas peticiones pueden ir a la vez.
 
     def obtener_datos_foto(self, id_foto): # Esta función se encarga de obtener la información de una foto específica, usando su ID (número de identificación).
         """Obtiene datos de una foto y su álbum asociado.""" # Este es un comentario que explica qué hace esta función. Está bien.
         try: # Intentamos hacer lo siguiente, y si algo sale mal, vamos a la parte que dice "except".
             # Obtener datos de la foto
-            foto = self._obtener_recurso(f"{URL_FOTOS}/{id_foto}") # Usamos una función interna para ir a la dirección web de la foto con el ID que nos dieron y obtener su información.
+            foto = self._obtener_recurso(f"{self.url_fotos}/{id_foto}") # Usamos una función interna para ir a la dirección web de la foto con el ID que nos dieron y obtener su información.
 
             # Obtener datos del álbum
-            album = self._obtener_recurso(f"{URL_ALBUMES}/{foto['albumId']}") # Una vez que tenemos la información de la foto, vemos a qué álbum pertenece y usamos otra vez la función interna para obtener la información de ese álbum.
-
-            return { # Devolvemos un "diccionario" (una especie de lista con etiquetas) con la información que obtuvimos.
-                'id': foto['id'], # El ID de la foto.
-                'titulo': foto['title'], # El título de la foto.
-                'url': foto['url'], # La dirección web donde se encuentra la foto.
-                'album': { # Dentro de la información de la foto, también incluimos la información del álbum.
-                    'id': album['id'], # El ID del álbum.
-                    'titulo': album['title'] # El título del álbum.
-                }
-            }
+            album = self.cache_albumes.obtener(foto['albumId'], self._obtener_album) # Una vez que tenemos la información de la foto, vemos a qué álbum pertenece y lo buscamos en la caché; solo se pide a la API si no lo teníamos ya.
+
+            return self._construir_registro(foto, album) # Juntamos la foto y su álbum en un único diccionario y lo devolvemos.
         except (excepciones_requests.RequestException, KeyError) as e: # Si ocurre algún error al hacer la petición a la web o si falta alguna información importante, hacemos lo siguiente.
-            logger.error(f"Error procesando foto {id_foto}: {str(e)}") # Guardamos un mensaje de error en el registro, indicando qué foto falló y cuál fue el error.
+            logger.error("Error procesando foto %s: %s", id_foto, e) # Guardamos un mensaje de error en el registro, indicando qué foto falló y cuál fue el error.
             return {'id': id_foto, 'error': str(e)} # Devolvemos un diccionario indicando que hubo un error con esta foto y cuál fue el error.
 
-    def _obtener_recurso(self, url): # Esta es una función interna (por eso empieza con un guion bajo) que se encarga de hacer la petición a una dirección web y obtener la información.
-        """Método interno para obtener recursos de la API.""" # Este comentario también está bien.
-        try: # Intentamos hacer la petición a la web.
-            respuesta = self.sesion.get(url, timeout=TIEMPO_ESPERA) # Usamos la "sesión" que creamos antes para ir a la dirección web que nos dieron y esperamos un máximo de 10 segundos por la respuesta.
+    def obtener_datos_masivos(self, limite=None): # Obtiene muchas fotos de golpe: una petición para las fotos y otra para los álbumes, en vez de dos por foto.
+        """Obtiene fotos y álbumes con dos peticiones de lista y los une en memoria."""
+        parametros_fotos = {'_start': 0, '_limit': limite} if limite else None # Si nos piden un número concreto de fotos, le decimos a la API que solo nos mande esas.
+        fotos = self._obtener_recurso(self.url_fotos, parametros_fotos) # Pedimos la lista de fotos en una sola petición.
+
+        ids_albumes = sorted({foto['albumId'] for foto in fotos}) # Vemos qué álbumes necesitamos realmente, sin repetir ninguno.
+        parametros_albumes = {'id': ids_albumes} if limite else None # Si no queremos todas las fotos, pedimos solo los álbumes que hacen falta (id=1&id=2...).
+        albumes = self._obtener_recurso(self.url_albumes, parametros_albumes) # Pedimos la lista de álbumes en otra sola petición.
+
+        indice_albumes = {album['id']: album for album in albumes} # Creamos un "índice" para encontrar cada álbum por su ID al instante.
+        for id_album, album in indice_albumes.items(): # Aprovechamos para llenar la caché, así los otros modos tampoco tendrán que pedirlos.
+            self.cache_albumes.guardar(id_album, album)
+
+        fotos_por_id = {foto['id']: foto for foto in fotos} # Otro índice, esta vez para encontrar cada foto por su ID.
+        ids_fotos = range(1, limite + 1) if limite else sorted(fotos_por_id) # Las fotos que vamos a devolver: de la 1 al límite, o todas las que llegaron.
+        resultados = [] # Aquí iremos guardando los resultados ya unidos.
+        for id_foto in ids_fotos: # Recorremos cada foto...
+            foto = fotos_por_id.get(id_foto) # ...la buscamos en el índice...
+            if foto is None: # ...y si la API no nos la mandó, lo anotamos como error, igual que haría obtener_datos_foto.
+                resultados.append({'id': id_foto, 'error': f"Foto {id_foto} no encontrada"})
+                continue
+            album = indice_albumes.get(foto['albumId']) # Buscamos su álbum en el índice, sin hacer ninguna petición.
+            if album is None: # Si el álbum no apareció en la lista, también es un error.
+                resultados.append({'id': id_foto, 'error': f"Álbum {foto['albumId']} no encontrado"})
+                continue
+            resultados.append(self._construir_registro(foto, album)) # Todo bien: juntamos foto y álbum con el mismo formato de siempre.
+        return resultados # Devolvemos la lista completa.
+
+    @staticmethod
+    def _construir_registro(foto, album): # Función interna que junta la información de una foto y de su álbum en el formato que devuelve el programa.
+        """Construye el registro de salida a partir de una foto y su álbum."""
+        return { # Devolvemos un "diccionario" (una especie de lista con etiquetas) con la información que obtuvimos.
+            'id': foto['id'], # El ID de la foto.
+            'titulo': foto['title'], # El título de la foto.
+            'url': foto['url'], # La dirección web donde se encuentra la foto.
+            'album': { # Dentro de la información de la foto, también incluimos la información del álbum.
+                'id': album['id'], # El ID del álbum.
+                'titulo': album['title'] # El título del álbum.
+            }
+        }
+
+    def _obtener_album(self, id_album): # Función interna que pide un álbum a la API. La usa la caché cuando no tiene el álbum guardado.
+        """Obtiene un álbum directamente de la API."""
+        return self._obtener_recurso(f"{self.url_albumes}/{id_album}") # Vamos a la dirección web del álbum y devolvemos su información.
+
+    def _obtener_recurso(self, url, parametros=None): # Esta es una función interna (por eso empieza con un guion bajo) que se encarga de hacer la petición a una dirección web y obtener la información.
+        """Método interno para obtener recursos de la API, con reintentos.""" # Este comentario también está bien.
+        for intento in range(REINTENTOS + 1): # Lo intentamos una vez y, si el fallo es pasajero, unas cuantas veces más.
+            try: # Intentamos hacer la petición a la web.
+                return self._hacer_peticion(url, parametros)
+            except excepciones_requests.RequestException as e: # Si ocurre algún error al hacer la petición (por ejemplo, si no hay conexión a internet), hacemos lo siguiente.
+                respuesta = getattr(e, 'response', None) # Si la API llegó a responder, aquí está su respuesta.
+                reintentable = ( # Solo merece la pena reintentar si el problema es pasajero: conexión, tiempo agotado o API saturada.
+                    isinstance(e, (excepciones_requests.ConnectionError, excepciones_requests.Timeout))
+                    or (respuesta is not None and respuesta.status_code in ESTADOS_REINTENTABLES)
+                )
+                if not reintentable or intento == REINTENTOS: # Si no lo es, o ya no quedan intentos...
+                    logger.debug("Error en petición a %s: %s", url, e) # Guardamos un mensaje de información detallada (DEBUG) en el registro sobre el error.
+                    raise # Volvemos a lanzar el error para que la función que llamó a esta sepa que algo salió mal.
+                espera = _calcular_espera(intento, respuesta.headers.get('Retry-After') if respuesta is not None else None) # Calculamos cuánto esperar antes de volver a intentarlo.
+                logger.debug("Reintentando %s en %.2fs (intento %d): %s", url, espera, intento + 1, e)
+                self.metricas.contar('reintentos', _endpoint(url)) # Apuntamos el reintento en las métricas.
+                time.sleep(espera) # Esperamos fuera del limitador, para no ocupar un hueco mientras tanto.
+
+    def _hacer_peticion(self, url, parametros): # Hace una sola petición, pasando por el limitador adaptativo.
+        """Hace una petición a la API respetando el limitador de concurrencia."""
+        self.limitador.adquirir() # Esperamos a que haya hueco.
+        inicio = time.perf_counter() # Medimos cuánto tarda la petición.
+        sobrecarga = True # Si la petición falla antes de recibir respuesta (tiempo agotado, conexión), lo tomamos como saturación.
+        estado = 'error' # Y en las métricas aparecerá como "error".
+        bytes_recibidos = 0
+        try:
+            respuesta = self.sesion.get(url, params=parametros, timeout=TIEMPO_ESPERA) # Usamos la "sesión" que creamos antes para ir a la dirección web que nos dieron (con sus parámetros, si los hay) y esperamos un máximo de 10 segundos por la respuesta.
+            estado = respuesta.status_code # Apuntamos el código que devolvió la API.
+            bytes_recibidos = len(respuesta.content) # Y cuánto ocupaba la respuesta.
+            self.metricas.registrar_fase('respuesta', respuesta.elapsed.total_seconds()) # Lo que tardaron en llegar las cabeceras (incluye abrir la conexión si era nueva).
+            sobrecarga = estado in ESTADOS_REINTENTABLES # Un 404 no es culpa de la carga; un 429 o un 503 sí.
             respuesta.raise_for_status() # Si la página web nos dice que hubo algún problema con la petición (por ejemplo, que no encontró la dirección), esto nos avisará.
-            return respuesta.json() # Si todo va bien, la página web nos devuelve la información en un formato llamado JSON, y aquí lo convertimos a un formato que Python puede entender (un diccionario o una lista).
-        except excepciones_requests.RequestException as e: # Si ocurre algún error al hacer la petición (por ejemplo, si no hay conexión a internet), hacemos lo siguiente.
-            logger.debug(f"Error en petición a {url}: {str(e)}") # Guardamos un mensaje de información detallada (DEBUG) en el registro sobre el error.
-            raise # Volvemos a lanzar el error para que la función que llamó a esta sepa que algo salió mal.
+            inicio_json = time.perf_counter()
+            datos = respuesta.json() # Si todo va bien, la página web nos devuelve la información en un formato llamado JSON, y aquí lo convertimos a un formato que Python puede entender (un diccionario o una lista).
+            self.metricas.registrar_fase('json', time.perf_counter() - inicio_json) # Lo que tardó Python en convertirla.
+            return datos
+        finally: # Pase lo que pase, liberamos el hueco y le contamos al limitador cómo fue.
+            latencia = time.perf_counter() - inicio
+            self.limitador.liberar(latencia, sobrecarga)
+            self.metricas.registrar(_endpoint(url), latencia, estado, bytes_recibidos) # Y lo apuntamos en las métricas.
 
 def obtener_total_fotos(obtenedor): # Esta función intenta obtener el número total de fotos disponibles en la página web.
     """Obtiene el número total de fotos disponibles.""" # Este comentario está bien.
     try: # Intentamos obtener la lista de todas las fotos.
-        datos = obtenedor._obtener_recurso(URL_FOTOS) # Usamos la función para obtener información de la dirección web de las fotos. Esto debería devolver una lista con todas las fotos.
+        datos = obtenedor._obtener_recurso(obtenedor.url_fotos) # Usamos la función para obtener información de la dirección web de las fotos. Esto debería devolver una lista con todas las fotos.
         return len(datos) # Contamos cuántos elementos hay en esa lista y ese será el número total de fotos.
     except excepciones_requests.RequestException: # Si no podemos obtener la lista de fotos (por ejemplo, si hay un problema con la conexión), hacemos lo siguiente.
         logger.warning("Usando valor por defecto para total de fotos") # Guardamos una advertencia en el registro indicando que vamos a usar el valor por defecto.
         return FOTOS_POR_DEFECTO # Devolvemos el número que definimos al principio como valor de respaldo (5000).
 
+def _ids_a_procesar(limite, ids_fotos): # Función interna que decide qué fotos procesar: las indicadas, o de la 1 al límite.
+    return range(1, limite+1) if ids_fotos is None else ids_fotos
+
+def iterar_secuencial(obtenedor, limite, ids_fotos=None): # Esta función obtiene la información de las fotos una por una, en orden, y entrega cada resultado en cuanto lo tiene.
+    """Flujo secuencial de resultados."""
+    ids_fotos = _ids_a_procesar(limite, ids_fotos) # Las fotos que vamos a procesar.
+    logger.info("Iniciando modo secuencial (%d fotos)...", len(ids_fotos)) # Guardamos un mensaje en el registro indicando que vamos a empezar a procesar las fotos de forma secuencial (una tras otra).
+    for id_foto in ids_fotos: # Recorremos las fotos una a una...
+        yield obtenedor.obtener_datos_foto(id_foto) # ...y entregamos cada resultado sin guardarlo en ninguna lista.
+
+def iterar_con_hilos(obtenedor, limite, ids_fotos=None): # Esta función usa "hilos" para obtener varias fotos a la vez y entrega los resultados según van terminando.
+    """Flujo concurrente de resultados usando hilos."""
+    from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait # Esto nos ayuda a hacer varias cosas a la vez usando "hilos" (como varios trabajadores haciendo tareas pequeñas).
+    ids_fotos = _ids_a_procesar(limite, ids_fotos) # Las fotos que vamos a procesar.
+    logger.info("Iniciando modo multihilos (%d fotos)...", len(ids_fotos)) # Guardamos un mensaje en el registro indicando que vamos a usar múltiples "hilos" para procesar las fotos al mismo tiempo.
+    hilos = min(obtenedor.limitador.maximo, len(ids_fotos)) # El número máximo de trabajadores será el menor entre el máximo del limitador y el número total de fotos que queremos procesar. El limitador decide después cuántos hacen peticiones a la vez.
+    pendientes = iter(ids_fotos) # Los IDs que todavía no hemos encargado a ningún hilo.
+
+    with ThreadPoolExecutor(max_workers=hilos) as ejecutor: # Creamos un grupo de "trabajadores" (hilos) que pueden hacer tareas en paralelo.
+        en_vuelo = { # Solo encargamos unas pocas tareas más que hilos, en vez de crear de golpe una tarea por cada foto.
+            ejecutor.submit(obtenedor.obtener_datos_foto, id_foto)
+            for id_foto in islice(pendientes, hilos * 2)
+        }
+        while en_vuelo: # Mientras quede alguna tarea sin terminar...
+            terminadas, en_vuelo = wait(en_vuelo, return_when=FIRST_COMPLETED) # ...esperamos a que acabe al menos una...
+            for futuro in terminadas: # ...y por cada una que acabó:
+                id_foto = next(pendientes, None) # encargamos la siguiente foto, si queda alguna...
+                if id_foto is not None:
+                    en_vuelo.add(ejecutor.submit(obtenedor.obtener_datos_foto, id_foto))
+                yield futuro.result() # ...y entregamos el resultado de la que terminó.
+
+# Cada proceso del modo procesos guarda aquí su propio obtenedor y sus hilos, creados una sola vez al arrancar.
+_obtenedor_trabajador = None
+_ejecutor_trabajador = None
+
+def _inicializar_trabajador(tamano_cache, ttl_cache, hilos, url_base, cola_logs=None, nivel_log=logging.WARNING): # Esta función se ejecuta una vez en cada proceso nuevo, antes de recibir trabajo.
+    """Prepara la sesión, el grupo de hilos y el registro de un proceso trabajador."""
+    from concurrent.futures import ThreadPoolExecutor
+    global _obtenedor_trabajador, _ejecutor_trabajador # Vamos a modificar las variables de arriba.
+    if cola_logs is not None: # Si el proceso principal tiene el registro configurado, le mandamos nuestros mensajes por esta cola.
+        raiz = logging.getLogger()
+        raiz.handlers[:] = [QueueHandler(cola_logs)] # Aquí sí usamos el QueueHandler normal: el mensaje tiene que llegar ya formateado al otro proceso.
+        raiz.setLevel(nivel_log)
+    _obtenedor_trabajador = ObtenedorFotos(tamano_cache, ttl_cache, max_concurrentes=hilos, url_base=url_base) # Un obtenedor (con su sesión, su caché y su limitador) que durará toda la vida del proceso.
+    _ejecutor_trabajador = ThreadPoolExecutor(max_workers=hilos) # Y un grupo de hilos para hacer varias peticiones a la vez dentro del proceso.
+
+def _procesar_bloque(ids_fotos): # Esta función la ejecuta un proceso trabajador con cada bloque de fotos que recibe.
+    """Obtiene un bloque de fotos con los hilos del proceso trabajador."""
+    resultados = list(_ejecutor_trabajador.map(_obtenedor_trabajador.obtener_datos_foto, ids_fotos)) # Repartimos las fotos del bloque entre los hilos.
+    return resultados, _obtenedor_trabajador.metricas.extraer() # Devolvemos los resultados junto con las métricas del bloque, para sumarlas en el proceso principal.
+
+def iterar_con_procesos(obtenedor, limite, hilos_por_proceso=HILOS_POR_PROCESO, ids_fotos=None): # Similar a la función anterior, pero en lugar de usar "hilos", usa "procesos", que son como programas separados que se ejecutan al mismo tiempo. Cada proceso tiene además sus propios hilos.
+    """Flujo paralelo de resultados usando procesos."""
+    import multiprocessing # Similar a los hilos, pero usa "procesos" que son como programas separados para hacer tareas en paralelo.
+    ids_fotos = _ids_a_procesar(limite, ids_fotos) # Las fotos que vamos a procesar.
+    procesos = min(os.cpu_count() or 1, len(ids_fotos)) # Un proceso por núcleo: más procesos que núcleos solo añade gasto.
+    logger.info("Iniciando modo multiprocesos (%d fotos, %d procesos × %d hilos)...", len(ids_fotos), procesos, hilos_por_proceso) # Guardamos un mensaje en el registro indicando que vamos a usar múltiples "procesos" para procesar las fotos en paralelo.
+
+    tamano_bloque = min(math.ceil(len(ids_fotos) / (procesos * BLOQUES_POR_PROCESO)), LOTE_MAXIMO) # Cuántas fotos van en cada bloque que mandamos a un proceso.
+    en_vuelo = threading.Semaphore(procesos * 2) # Como en el modo hilos, solo encargamos unos pocos bloques más que procesos, para que no se acumulen resultados si nadie los lee.
+    cerrado = threading.Event() # Se activa si nos dejan de leer, para dejar de repartir.
+
+    def repartir(): # Partimos las fotos en bloques. Si son un rango, cada bloque también lo es, y enviar un rango es mucho más barato que enviar las fotos de una en una.
+        for primero in range(0, len(ids_fotos), tamano_bloque):
+            en_vuelo.acquire() # El grupo de procesos pide los bloques desde un hilo propio; aquí espera a que leamos alguno.
+            if cerrado.is_set():
+                return
+            yield ids_fotos[primero:primero + tamano_bloque]
+
+    cola_logs = escuchador = None
+    if _escuchador_logging is not None: # Si el registro está configurado, los procesos nos mandan sus mensajes por una cola y aquí los escriben los mismos destinos.
+        cola_logs = multiprocessing.Queue()
+        escuchador = QueueListener(cola_logs, *_escuchador_logging.handlers)
+        escuchador.start()
+    try:
+        with multiprocessing.Pool( # Creamos un grupo de "procesos" que pueden trabajar en paralelo.
+            processes=procesos,
+            initializer=_inicializar_trabajador, # Cada proceso prepara su propia sesión al arrancar, en vez de recibir una copia del obtenedor con cada tarea.
+            initargs=( # Le pasamos solo la configuración, que es muy ligera.
+                obtenedor.cache_albumes.tamano_maximo, obtenedor.cache_albumes.ttl, hilos_por_proceso, obtenedor.url_base,
+                cola_logs, logging.getLogger().level
+            )
+        ) as grupo:
+            try:
+                for bloque, metricas in grupo.imap_unordered(_procesar_bloque, repartir()): # Recogemos cada bloque según termina, en el orden en que terminen...
+                    obtenedor.metricas.combinar(metricas) # ...sumamos sus métricas a las del proceso principal...
+                    yield from bloque # ...entregamos sus resultados uno a uno...
+                    en_vuelo.release() # ...y dejamos sitio para el siguiente bloque.
+                grupo.close() # Dejamos que los procesos terminen solos, así envían antes todos sus mensajes.
+                grupo.join()
+            finally: # Si nos dejan de leer a medias, despertamos al reparto para que termine antes de cerrar el grupo.
+                cerrado.set()
+                en_vuelo.release()
+    finally:
+        if escuchador is not None:
+            escuchador.stop()
+
+def iterar_masivo(obtenedor, limite=None, ids_fotos=None): # Esta función obtiene todas las fotos con solo dos peticiones (fotos y álbumes) y las une en memoria.
+    """Flujo de resultados de la obtención masiva con dos peticiones de lista."""
+    if ids_fotos is not None: # Si nos dan unas fotos concretas, descargamos hasta la mayor de ellas y luego nos quedamos solo con las pedidas.
+        limite = max(ids_fotos, default=0)
+    logger.info("Iniciando modo masivo (%s fotos)...", limite or 'todas las') # Guardamos un mensaje en el registro indicando que vamos a pedir todo de golpe.
+    try: # Intentamos pedir las dos listas. Aquí las listas completas sí están en memoria: es el precio de hacer solo dos peticiones.
+        resultados = obtenedor.obtener_datos_masivos(limite) # Pedimos las fotos y los álbumes y los juntamos.
+    except (excepciones_requests.RequestException, KeyError) as e: # Si falla alguna de las dos peticiones, ninguna foto se puede completar.
+        logger.error("Error en la obtención masiva: %s", e) # Lo anotamos en el registro.
+        if limite is None: # Sin --fotos no sabemos cuántas había: las contamos como los demás modos (o usamos el valor por defecto), para que el fallo no pase por una ejecución vacía.
+            limite = obtener_total_fotos(obtenedor)
+        mensaje = str(e) # Python borra "e" al salir del except, así que guardamos el mensaje para el generador.
+        resultados = ({'id': i+1, 'error': mensaje} for i in range(limite)) # Y entregamos un error por cada foto, igual que harían los otros modos.
+    if ids_fotos is not None: # Si nos pidieron unas fotos concretas, descartamos las demás.
+        pedidas = set(ids_fotos)
+        resultados = (resultado for resultado in resultados if resultado['id'] in pedidas)
+    yield from resultados # Entregamos los resultados uno a uno.
+
+def iterar_async(obtenedor, limite, concurrencia=CONCURRENCIA_ASYNC, ids_fotos=None): # Esta función obtiene las fotos con asyncio: un solo hilo que lanza muchas peticiones y atiende las respuestas según llegan.
+    """Flujo asíncrono de resultados con concurrencia limitada y conexiones reutilizables."""
+    import asyncio # Nos permite hacer muchas peticiones a la vez con un solo hilo, esperando las respuestas sin quedarnos bloqueados.
+    ids_fotos = _ids_a_procesar(limite, ids_fotos) # Las fotos que vamos a procesar.
+    logger.info("Iniciando modo async (%d fotos, %d concurrentes)...", len(ids_fotos), concurrencia) # Guardamos un mensaje en el registro indicando que vamos a usar el modo asíncrono.
+    bucle = asyncio.new_event_loop() # Creamos nuestro propio "bucle de eventos" para poder avanzarlo resultado a resultado.
+    generador = _iterar_fotos_async(obtenedor, ids_fotos, concurrencia) # El generador asíncrono que produce los resultados.
+    try:
+        while True: # Avanzamos el bucle justo lo necesario para obtener el siguiente resultado...
+            try:
+                resultado = bucle.run_until_complete(generador.__anext__())
+            except StopAsyncIteration: # ...hasta que no quedan más.
+                break
+            yield resultado # Lo entregamos a quien nos esté leyendo.
+    finally: # Tanto si terminamos como si nos dejan de leer a medias, cerramos todo ordenadamente.
+        bucle.run_until_complete(generador.aclose()) # Cerramos el generador (cancela los trabajadores y la sesión).
+        bucle.run_until_complete(bucle.shutdown_asyncgens())
+        bucle.close()
+
+async def _iterar_fotos_async(obtenedor, ids_fotos, concurrencia): # Función interna que reparte las fotos entre un grupo fijo de "trabajadores" asíncronos.
+    """Produce los resultados de las fotos indicadas con un grupo de corrutinas de tamaño fijo."""
+    import asyncio
+    import aiohttp # Solo el modo async necesita esta librería, así que la importamos aquí y los demás modos funcionan sin ella.
+
+    conector = aiohttp.TCPConnector( # El conector guarda las conexiones abiertas para reutilizarlas (keep-alive).
+        limit=concurrencia, # Como máximo, tantas conexiones como peticiones simultáneas.
+        limit_per_host=concurrencia, # Todas van al mismo servidor, así que el límite por servidor es el mismo.
+        ttl_dns_cache=300 # Recordamos la dirección del servidor 5 minutos para no preguntarla en cada conexión.
+    )
+    tiempo_espera = aiohttp.ClientTimeout(total=TIEMPO_ESPERA) # El mismo límite de tiempo por petición que en los demás modos.
+    trazas = _crear_trazas(aiohttp, obtenedor.metricas) # Para apuntar cuánto tarda cada DNS y cada conexión nueva.
+    pendientes = iter(ids_fotos) # Una "cola" de IDs que los trabajadores irán sacando uno a uno.
+    cola = asyncio.Queue(maxsize=concurrencia) # Aquí los trabajadores dejan los resultados. Tiene tamaño máximo para que no se acumulen si nadie los lee.
+    fin = object() # Una "señal" que deja cada trabajador al terminar.
+
+    async with aiohttp.ClientSession( # Abrimos una sesión asíncrona, el equivalente a la Session de requests.
+        connector=conector,
+        timeout=tiempo_espera,
+        headers=dict(obtenedor.sesion.headers), # Nos presentamos a la API igual que en los demás modos.
+        trace_configs=[trazas]
+    ) as sesion:
+        async def trabajador(): # Cada trabajador coge el siguiente ID libre, lo procesa y repite hasta que no quedan.
+            try:
+                for id_foto in pendientes: # Todos comparten el mismo iterador; al haber un solo hilo, nunca se pisan.
+                    await cola.put(await _obtener_datos_foto_async(obtenedor, sesion, id_foto))
+                await cola.put(fin) # Avisamos de que este trabajador ha terminado.
+            except Exception as e: # Un error inesperado se pasa por la cola para que no nos quedemos esperando para siempre.
+                await cola.put(e)
+
+        trabajadores = [ # Lanzamos tantos trabajadores como peticiones simultáneas queremos.
+            asyncio.create_task(trabajador())
+            for _ in range(min(concurrencia, len(ids_fotos)))
+        ]
+        activos = len(trabajadores) # Cuántos trabajadores siguen en marcha.
+        try:
+            while activos: # Mientras quede alguno trabajando, vamos sacando resultados de la cola.
+                resultado = await cola.get()
+                if resultado is fin: # Un trabajador ha terminado.
+                    activos -= 1
+                elif isinstance(resultado, Exception): # Un trabajador ha fallado de forma inesperada.
+                    raise resultado
+                else:
+                    yield resultado # Entregamos el resultado.
+        finally: # Si nos dejan de leer a medias, cancelamos a los trabajadores que queden.
+            for tarea in trabajadores:
+                tarea.cancel()
+            await asyncio.gather(*trabajadores, return_exceptions=True)
+            await obtenedor.cache_albumes.cancelar_async() # Y también las peticiones de álbumes que esperaban.
+
+def _crear_trazas(aiohttp, metricas): # aiohttp avisa al empezar y al terminar cada fase de la conexión; aquí apuntamos lo que tarda.
+    """Crea la configuración de trazas de aiohttp que mide DNS y conexiones nuevas."""
+    trazas = aiohttp.TraceConfig()
+
+    async def inicio_dns(sesion, contexto, parametros):
+        contexto.inicio_dns = time.perf_counter() # Cada petición tiene su propio "contexto", donde guardamos cuándo empezó.
+
+    async def fin_dns(sesion, contexto, parametros):
+        metricas.registrar_fase('dns', time.perf_counter() - contexto.inicio_dns)
+
+    async def inicio_conexion(sesion, contexto, parametros):
+        contexto.inicio_conexion = time.perf_counter()
+
+    async def fin_conexion(sesion, contexto, parametros): # Solo se llama al abrir una conexión nueva, no al reutilizar una.
+        metricas.registrar_fase('conexion', time.perf_counter() - contexto.inicio_conexion)
+        metricas.contar('conexiones_nuevas')
+
+    trazas.on_dns_resolvehost_start.append(inicio_dns)
+    trazas.on_dns_resolvehost_end.append(fin_dns)
+    trazas.on_connection_create_start.append(inicio_conexion)
+    trazas.on_connection_create_end.append(fin_conexion)
+    return trazas
+
+async def _obtener_datos_foto_async(obtenedor, sesion, id_foto): # Versión asíncrona de obtener_datos_foto.
+    """Obtiene datos de una foto y su álbum asociado de forma asíncrona."""
+    import asyncio
+    import aiohttp
+
+    async def obtener_album(id_album): # La caché la llamará solo si no tiene el álbum y nadie lo está pidiendo ya.
+        return await _obtener_recurso_async(obtenedor, sesion, f"{obtenedor.url_albumes}/{id_album}")
+
+    try: # Intentamos hacer lo siguiente, y si algo sale mal, vamos a la parte que dice "except".
+        foto = await _obtener_recurso_async(obtenedor, sesion, f"{obtenedor.url_fotos}/{id_foto}") # Pedimos la foto sin bloquear a los demás trabajadores.
+        album = await obtenedor.cache_albumes.obtener_async(foto['albumId'], obtener_album) # Buscamos el álbum en la caché compartida.
+        return ObtenedorFotos._construir_registro(foto, album) # Mismo formato que el resto de modos.
+    except (aiohttp.ClientError, asyncio.TimeoutError, KeyError, ValueError) as e: # Errores de red, de tiempo, de datos incompletos o de JSON inválido (en requests, este último ya es un RequestException).
+        logger.error("Error procesando foto %s: %s", id_foto, str(e) or type(e).__name__) # Algunos errores (como el de tiempo) no traen mensaje, así que usamos su nombre.
+        return {'id': id_foto, 'error': str(e) or type(e).__name__}
+
+async def _obtener_recurso_async(obtenedor, sesion, url): # Versión asíncrona de _obtener_recurso, con los mismos reintentos.
+    """Obtiene un recurso de la API de forma asíncrona, con reintentos."""
+    import asyncio
+    import aiohttp
+    for intento in range(REINTENTOS + 1): # Lo intentamos una vez y, si el fallo es pasajero, unas cuantas veces más.
+        try:
+            return await _hacer_peticion_async(obtenedor, sesion, url)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if isinstance(e, aiohttp.ClientConnectorError): # No se pudo abrir la conexión.
+                obtenedor.metricas.contar('conexiones_fallidas')
+            es_respuesta = isinstance(e, aiohttp.ClientResponseError) # La API respondió, pero con un código de error.
+            reintentable = ( # Igual que en _obtener_recurso: conexión, tiempo agotado o API saturada.
+                isinstance(e, (aiohttp.ClientConnectionError, asyncio.TimeoutError))
+                or (es_respuesta and e.status in ESTADOS_REINTENTABLES)
+            )
+            if not reintentable or intento == REINTENTOS: # Si no lo es, o ya no quedan intentos, lanzamos el error.
+                logger.debug("Error en petición a %s: %s", url, e)
+                raise
+            espera = _calcular_espera(intento, e.headers.get('Retry-After') if es_respuesta and e.headers else None)
+            logger.debug("Reintentando %s en %.2fs (intento %d): %s", url, espera, intento + 1, e)
+            obtenedor.metricas.contar('reintentos', _endpoint(url)) # Apuntamos el reintento en las métricas.
+            await asyncio.sleep(espera) # Esperamos sin bloquear a los demás trabajadores.
+
+async def _hacer_peticion_async(obtenedor, sesion, url): # Versión asíncrona de _hacer_peticion: una sola petición, apuntada en las métricas.
+    """Hace una petición asíncrona a la API y devuelve su JSON."""
+    inicio = time.perf_counter() # Medimos cuánto tarda la petición.
+    estado = 'error' # Si no llega respuesta, lo apuntamos como error.
+    bytes_recibidos = 0
+    try:
+        async with sesion.get(url) as respuesta: # Hacemos la petición; al salir, la conexión vuelve al conector para reutilizarse.
+            obtenedor.metricas.registrar_fase('respuesta', time.perf_counter() - inicio) # Lo que tardaron en llegar las cabeceras.
+            estado = respuesta.status # Apuntamos el código que devolvió la API.
+            cuerpo = await respuesta.read() # Leemos la respuesta entera.
+            bytes_recibidos = len(cuerpo)
+            respuesta.raise_for_status() # Si la API responde con un error, lo lanzamos.
+            inicio_json = time.perf_counter()
+            datos = json.loads(cuerpo) # Y la convertimos de JSON, midiendo cuánto tarda.
+            obtenedor.metricas.registrar_fase('json', time.perf_counter() - inicio_json)
+            return datos
+    finally: # Pase lo que pase, lo apuntamos en las métricas.
+        obtenedor.metricas.registrar(_endpoint(url), time.perf_counter() - inicio, estado, bytes_recibidos)
+
 def ejecutar_secuencial(obtenedor, limite): # Esta función ejecuta el proceso de obtener información de las fotos una por una, en orden.
     """Ejecución secuencial de las peticiones.""" # Este comentario está bien.
-    logger.info(f"Iniciando modo secuencial ({limite} fotos)...") # Guardamos un mensaje en el registro indicando que vamos a empezar a procesar las fotos de forma secuencial (una tras otra).
-    inicio = time.perf_counter() # Medimos el tiempo justo antes de empezar.
-    resultados = [obtenedor.obtener_datos_foto(i+1) for i in range(limite)] # Creamos una lista donde vamos a guardar los resultados de obtener la información de cada foto, desde la foto número 1 hasta el límite que nos hayan indicado.
-    return resultados, time.perf_counter() - inicio # Devolvemos la lista de resultados y el tiempo que tardamos en obtenerlos.
+    return _ejecutar(iterar_secuencial(obtenedor, limite)) # Recogemos todo el flujo en una lista y medimos el tiempo.
 
 def ejecutar_con_hilos(obtenedor, limite): # Esta función intenta obtener la información de las fotos usando "hilos", lo que permite hacer varias cosas a la vez y podría ser más rápido.
     """Ejecución concurrente usando hilos.""" # Este comentario está bien.
-    logger.info(f"Iniciando modo multihilos ({limite} fotos)...") # Guardamos un mensaje en el registro indicando que vamos a usar múltiples "hilos" para procesar las fotos al mismo tiempo.
-    inicio = time.perf_counter() # Medimos el tiempo justo antes de empezar.
+    return _ejecutar(iterar_con_hilos(obtenedor, limite))
 
-    with ThreadPoolExecutor( # Creamos un grupo de "trabajadores" (hilos) que pueden hacer tareas en paralelo.
-        max_workers=min(MAX_CONCURRENTES, limite) # El número máximo de trabajadores será el menor entre el límite que definimos al principio (50) y el número total de fotos que queremos procesar. Así no creamos demasiados trabajadores si no son necesarios.
-    ) as ejecutor: # Le damos un nombre a este grupo de trabajadores.
-        futuros = [ # Creamos una lista de "tareas" que vamos a darles a los trabajadores.
-            ejecutor.submit(obtenedor.obtener_datos_foto, i+1) # Para cada foto desde la 1 hasta el límite, creamos una tarea para obtener su información.
-            for i in range(limite)
-        ]
-        resultados = [f.result() for f in as_completed(futuros)] # Esperamos a que todos los trabajadores terminen sus tareas y recogemos los resultados de cada uno.
+def ejecutar_con_procesos(obtenedor, limite, hilos_por_proceso=HILOS_POR_PROCESO): # Igual, pero con procesos.
+    """Ejecución paralela usando procesos.""" # Este comentario está bien.
+    return _ejecutar(iterar_con_procesos(obtenedor, limite, hilos_por_proceso))
 
-    return resultados, time.perf_counter() - inicio # Devolvemos la lista de resultados y el tiempo total que tardamos.
+def ejecutar_masivo(obtenedor, limite=None): # Igual, pero con solo dos peticiones de lista.
+    """Ejecución masiva con dos peticiones de lista."""
+    return _ejecutar(iterar_masivo(obtenedor, limite))
 
-def ejecutar_con_procesos(obtenedor, limite): # Similar a la función anterior, pero en lugar de usar "hilos", usa "procesos", que son como programas separados que se ejecutan al mismo tiempo. Esto también puede ser más rápido en algunos casos.
-    """Ejecución paralela usando procesos.""" # Este comentario está bien.
-    logger.info(f"Iniciando modo multiprocesos ({limite} fotos)...") # Guardamos un mensaje en el registro indicando que vamos a usar múltiples "procesos" para procesar las fotos en paralelo.
+def ejecutar_async(obtenedor, limite, concurrencia=CONCURRENCIA_ASYNC): # Igual, pero con asyncio.
+    """Ejecución asíncrona con concurrencia limitada y conexiones reutilizables."""
+    return _ejecutar(iterar_async(obtenedor, limite, concurrencia))
+
+def _ejecutar(flujo): # Función interna que convierte un flujo de resultados en la lista que devuelven las funciones "ejecutar_*".
+    """Recoge un flujo de resultados en una lista y mide cuánto tarda."""
     inicio = time.perf_counter() # Medimos el tiempo justo antes de empezar.
+    resultados = list(flujo) # Leemos el flujo entero y guardamos todos los resultados.
+    return resultados, time.perf_counter() - inicio # Devolvemos la lista de resultados y el tiempo que tardamos en obtenerlos.
+
+class EscritorNDJSON: # Escribe cada resultado como una línea JSON independiente (NDJSON), así el archivo se puede leer aunque el programa se corte.
+    """Escribe resultados en formato NDJSON, una línea por registro."""
+
+    def __init__(self, archivo): # Recibe un archivo ya abierto para escribir.
+        self.archivo = archivo
+
+    def escribir(self, registro): # Convierte el resultado a JSON y lo añade al archivo.
+        self.archivo.write(json.dumps(registro, ensure_ascii=False) + '\n')
+
+class EscritorCSV: # Escribe los resultados como una tabla CSV, que se puede abrir con una hoja de cálculo.
+    """Escribe resultados en formato CSV con el álbum aplanado en columnas."""
+    COLUMNAS = ['id', 'titulo', 'url', 'album_id', 'album_titulo', 'error'] # Las columnas de la tabla.
+
+    def __init__(self, archivo): # Recibe un archivo ya abierto y escribe la fila de cabecera.
+        import csv # Para escribir los resultados como una tabla CSV.
+        self._csv = csv.DictWriter(archivo, fieldnames=self.COLUMNAS)
+        self._csv.writeheader()
+
+    def escribir(self, registro): # Aplana el diccionario (el álbum va en dos columnas) y escribe la fila.
+        album = registro.get('album', {})
+        self._csv.writerow({
+            'id': registro['id'],
+            'titulo': registro.get('titulo', ''),
+            'url': registro.get('url', ''),
+            'album_id': album.get('id', ''),
+            'album_titulo': album.get('titulo', ''),
+            'error': registro.get('error', '')
+        })
 
-    with Pool(processes=min(MAX_CONCURRENTES, limite)) as grupo: # Creamos un grupo de "procesos" que pueden trabajar en paralelo. El número máximo de procesos será el menor entre el límite que definimos y el número de fotos a procesar.
-        resultados = grupo.map(obtenedor.obtener_datos_foto, range(1, limite+1)) # Le damos al grupo de procesos la tarea de obtener la información de cada foto desde la 1 hasta el límite.
+@contextmanager
+def abrir_escritor(ruta): # Abre el archivo de salida y elige el escritor según la extensión: ".csv" para CSV y cualquier otra para NDJSON.
+    """Abre un archivo de salida con escritura en búfer y devuelve su escritor."""
+    with open(ruta, 'w', encoding='utf-8', newline='', buffering=TAMANO_BUFFER_SALIDA) as archivo: # Con un búfer grande, el sistema escribe al disco en trozos y no en cada línea.
+        yield EscritorCSV(archivo) if ruta.lower().endswith('.csv') else EscritorNDJSON(archivo)
 
-    return resultados, time.perf_counter() - inicio # Devolvemos la lista de resultados y el tiempo total que tardamos.
+def consumir_resultados(resultados, escritor=None): # Recorre el flujo de resultados sin guardarlos: solo escribe cada uno (si hay escritor) y cuenta.
+    """Consume un flujo de resultados y devuelve los contadores de correctos y errores."""
+    exitos = errores = 0 # Solo guardamos dos números, así la memoria no crece aunque haya millones de fotos.
+    for resultado in resultados: # Por cada resultado que llega...
+        if escritor is not None: # ...lo escribimos en el archivo de salida, si nos pidieron uno...
+            escritor.escribir(resultado)
+        if 'error' in resultado: # ...y lo contamos como error o como correcto.
+            errores += 1
+        else:
+            exitos += 1
+    return exitos, errores # Devolvemos los dos contadores.
 
-def comparar_modos(obtenedor, limite): # Esta función ejecuta las tres formas de obtener las fotos (secuencial, con hilos y con procesos) para un número limitado de fotos y compara cuánto tiempo tarda cada una.
+def con_progreso(resultados, total, metricas, salida=None, intervalo=INTERVALO_PROGRESO): # Envuelve un flujo de resultados: los deja pasar tal cual y, de vez en cuando, reescribe una línea con el avance.
+    """Deja pasar un flujo de resultados mostrando una línea de progreso en vivo."""
+    salida = salida or sys.stderr # Por defecto, la terminal de errores, para no mezclarse con los resultados.
+    hechos = errores = 0
+    inicio = ultima = time.perf_counter()
+
+    def mostrar(ahora, fin=''):
+        transcurrido = ahora - inicio
+        porcentaje = f" ({100 * hechos / total:.1f}%)" if total else ''
+        salida.write(
+            f"\r{hechos}/{total or '?'}{porcentaje} | {hechos / transcurrido if transcurrido else 0.0:.1f} fotos/s"
+            f" | {errores} errores | p95 {metricas.percentil(0.95) * 1000:.0f} ms{fin}" # "\r" vuelve al principio de la línea, así se sobrescribe la anterior.
+        )
+        salida.flush()
+
+    try:
+        for resultado in resultados:
+            hechos += 1
+            if 'error' in resultado:
+                errores += 1
+            ahora = time.perf_counter()
+            if ahora - ultima >= intervalo: # No actualizamos en cada foto: escribir en la terminal también cuesta.
+                mostrar(ahora)
+                ultima = ahora
+            yield resultado
+    finally: # Al terminar (o si se corta), dejamos la línea final y saltamos de línea.
+        mostrar(time.perf_counter(), '\n')
+
+def mostrar_metricas(metricas): # Escribe en el registro el resumen final de las peticiones, para ver dónde se fue el tiempo.
+    """Escribe en el registro el resumen de las métricas de las peticiones.
+
+    La fase 'dns' solo aparece en el modo async; en los demás, el DNS va incluido en 'conexion'.
+    """
+    resumen = metricas.resumen()
+    logger.info(
+        "Peticiones: %d (%d fallidas, %d reintentos), %.2f MB recibidos",
+        resumen['peticiones'], resumen['errores'], resumen['reintentos'], resumen['bytes'] / 2 ** 20
+    )
+    logger.info(
+        "Conexiones: %d nuevas, %d reutilizadas, %d fallidas",
+        resumen['conexiones']['nuevas'], resumen['conexiones']['reutilizadas'], resumen['conexiones']['fallidas']
+    )
+    for endpoint, datos in resumen['endpoints'].items(): # La latencia de cada endpoint por separado.
+        logger.info(
+            "  /%s: %d peticiones, p50 %.1f ms, p95 %.1f ms", endpoint, datos['peticiones'], datos['p50'] * 1000, datos['p95'] * 1000
+        )
+    for fase, datos in resumen['fases'].items(): # Y de cada fase: si la que domina es "conexion", el problema es la red; si es "respuesta", el servidor; si es "json", Python.
+        logger.info(
+            "  Fase %s: p50 %.1f ms, p95 %.1f ms, total %.2fs", fase, datos['p50'] * 1000, datos['p95'] * 1000, datos['total']
+        )
+
+class AlmacenProgreso: # Un pequeño archivo de base de datos (SQLite) donde apuntamos cada foto procesada, para poder continuar si el programa se corta.
+    """Almacén en disco de los resultados ya obtenidos, para reanudar ejecuciones."""
+
+    def __init__(self, ruta, lote=LOTE_PROGRESO): # Abre (o crea) la base de datos en la ruta indicada.
+        import sqlite3 # Una base de datos en un solo archivo; solo la cargamos si se pide guardar el progreso.
+        self.conexion = sqlite3.connect(ruta) # Nos conectamos al archivo; si no existe, SQLite lo crea.
+        self.conexion.execute('PRAGMA journal_mode=WAL') # Un modo de escritura más rápido y que aguanta mejor los cortes.
+        self.conexion.execute( # Creamos la tabla la primera vez: una fila por foto, con su resultado y su error (si lo hubo).
+            'CREATE TABLE IF NOT EXISTS fotos (id INTEGER PRIMARY KEY, registro TEXT NOT NULL, error TEXT)'
+        )
+        self.lote = lote # Cada cuántos resultados confirmamos los cambios en el disco.
+        self._sin_confirmar = 0 # Resultados guardados desde la última confirmación.
+
+    def guardar(self, resultado): # Apunta un resultado. Si la foto ya estaba, se sustituye (así un error antiguo se corrige al reintentarlo).
+        """Guarda o sustituye el resultado de una foto."""
+        self.conexion.execute(
+            'INSERT OR REPLACE INTO fotos (id, registro, error) VALUES (?, ?, ?)',
+            (resultado['id'], json.dumps(resultado, ensure_ascii=False), resultado.get('error'))
+        )
+        self._sin_confirmar += 1
+        if self._sin_confirmar >= self.lote: # Confirmar en lotes es mucho más rápido que hacerlo con cada foto.
+            self.confirmar()
+
+    def registrar(self, resultados): # Envuelve un flujo de resultados: guarda cada uno y lo deja pasar tal cual.
+        """Guarda cada resultado del flujo según pasa por él."""
+        for resultado in resultados:
+            self.guardar(resultado)
+            yield resultado
+
+    def completadas(self): # Devuelve los IDs de las fotos que ya se obtuvieron sin error.
+        """Devuelve el conjunto de IDs obtenidos correctamente."""
+        return {fila[0] for fila in self.conexion.execute('SELECT id FROM fotos WHERE error IS NULL')}
+
+    def completados(self, limite): # Devuelve, en orden y de uno en uno, los resultados correctos ya guardados de las fotos 1 al límite.
+        """Itera sobre los registros obtenidos correctamente con ID hasta limite."""
+        consulta = self.conexion.execute('SELECT registro FROM fotos WHERE error IS NULL AND id <= ? ORDER BY id', (limite,))
+        return (json.loads(fila[0]) for fila in consulta) # Se leen según se piden, sin cargarlos todos en memoria.
+
+    def pendientes(self, limite): # Devuelve, en orden, las fotos de la 1 al límite que aún no tenemos o que terminaron con error.
+        """Devuelve los IDs entre 1 y limite que faltan o terminaron con error."""
+        completadas = self.completadas()
+        return [id_foto for id_foto in range(1, limite+1) if id_foto not in completadas]
+
+    def confirmar(self): # Escribe definitivamente en el disco los resultados pendientes.
+        """Confirma en disco los resultados guardados."""
+        self.conexion.commit()
+        self._sin_confirmar = 0
+
+    def cerrar(self): # Confirma lo que quede y cierra la base de datos.
+        """Confirma los cambios pendientes y cierra la conexión."""
+        self.confirmar()
+        self.conexion.close()
+
+    def __enter__(self): # Permite usar el almacén con "with", que lo cierra solo al terminar...
+        return self
+
+    def __exit__(self, *detalles_error): # ...incluso si el usuario interrumpe el programa con Ctrl+C.
+        self.cerrar()
+
+def medir(obtenedor, flujo): # Recorre un flujo de resultados midiendo el tiempo, los errores y la latencia de las peticiones.
+    """Consume un flujo de resultados y devuelve sus medidas de rendimiento."""
+    obtenedor.cache_albumes.limpiar() # Vaciamos la caché de álbumes para que ninguna medida se aproveche del trabajo de la anterior.
+    obtenedor.metricas.extraer() # Y ponemos las métricas a cero.
+    inicio = time.perf_counter() # Medimos el tiempo justo antes de empezar.
+    exitos, errores = consumir_resultados(flujo) # Recorremos el flujo contando correctos y errores.
+    tiempo = time.perf_counter() - inicio # Lo que tardó.
+    metricas = obtenedor.metricas.extraer() # Las métricas de las peticiones de esta medida.
+    return { # Devolvemos todo en un diccionario.
+        'fotos': exitos + errores,
+        'errores': errores,
+        'tiempo': tiempo,
+        'fotos_por_segundo': (exitos + errores) / tiempo if tiempo else 0.0,
+        'peticiones': metricas.total(),
+        'peticiones_fallidas': metricas.errores(),
+        'p50': metricas.percentil(0.50),
+        'p95': metricas.percentil(0.95),
+        'p99': metricas.percentil(0.99)
+    }
+
+def comparar_modos(obtenedor, limite): # Esta función ejecuta todas las formas de obtener las fotos para un número limitado de fotos y compara cuánto tarda cada una. Para medidas más serias, usa benchmark.py.
     """Comparativa de rendimiento entre modos de ejecución.""" # Este comentario está bien.
-    modos = { # Creamos un diccionario donde guardamos los nombres de los modos de ejecución y las funciones que los ejecutan.
-        'Secuencial': ejecutar_secuencial,
-        'Multihilos': ejecutar_con_hilos,
-        'Multiprocesos': ejecutar_con_procesos
+    modos = { # Creamos un diccionario donde guardamos los nombres de los modos de ejecución y las funciones que producen su flujo de resultados.
+        'Secuencial': iterar_secuencial,
+        'Multihilos': iterar_con_hilos,
+        'Multiprocesos': iterar_con_procesos,
+        'Masivo': iterar_masivo,
+        'Asíncrono': iterar_async
     }
 
-    resultados = {} # Creamos un diccionario para guardar el tiempo que tarda cada modo.
+    resultados = {} # Creamos un diccionario para guardar las medidas de cada modo.
     for nombre, funcion in modos.items(): # Recorremos cada modo de ejecución.
-        logger.info(f"Ejecutando modo {nombre}...") # Guardamos un mensaje en el registro indicando qué modo estamos ejecutando.
-        _, tiempo_transcurrido = funcion(obtenedor, limite) # Ejecutamos la función del modo actual para el límite de fotos indicado y obtenemos el tiempo que tardó. No nos interesan los resultados de las fotos en este caso, solo el tiempo.
-        resultados[nombre] = tiempo_transcurrido # Guardamos el tiempo que tardó este modo en el diccionario de resultados.
-        time.sleep(2)  # Pausa entre ejecuciones. Esperamos 2 segundos entre la ejecución de cada modo para que no se mezclen los resultados en la terminal.
+        logger.info("Ejecutando modo %s...", nombre) # Guardamos un mensaje en el registro indicando qué modo estamos ejecutando.
+        resultados[nombre] = medir(obtenedor, funcion(obtenedor, limite)) # Ejecutamos el modo actual y guardamos sus medidas.
 
     # Presentación de resultados
-    logger.info("\n" + "═" * 50) # Imprimimos una línea de guiones para separar los resultados.
-    logger.info(f"COMPARATIVA PARA {limite} FOTOS:") # Indicamos para cuántas fotos se hizo la comparación.
-    for nombre, tiempo in resultados.items(): # Recorremos los resultados de cada modo.
-        logger.info(f"{nombre:<12}: {tiempo:.2f} segundos") # Imprimimos el nombre del modo y el tiempo que tardó, formateado a dos decimales.
+    logger.info("\n%s", "═" * 78) # Imprimimos una línea para separar los resultados.
+    logger.info("COMPARATIVA PARA %d FOTOS:", limite) # Indicamos para cuántas fotos se hizo la comparación.
+    logger.info("%-14s%9s%10s%9s%9s%9s%9s", 'Modo', 'Tiempo', 'Fotos/s', 'p50 ms', 'p95 ms', 'p99 ms', 'Errores')
+    for nombre, medida in resultados.items(): # Recorremos los resultados de cada modo.
+        logger.info( # Imprimimos el nombre del modo, el tiempo, el ritmo, las latencias y los errores.
+            "%-14s%8.2fs%10.1f%9.1f%9.1f%9.1f%9d",
+            nombre, medida['tiempo'], medida['fotos_por_segundo'],
+            medida['p50'] * 1000, medida['p95'] * 1000, medida['p99'] * 1000, medida['errores']
+        )
 
-    mas_rapido = min(resultados, key=resultados.get) # Encontramos el nombre del modo que tardó menos tiempo.
-    logger.info(f"\nModo más rápido: {mas_rapido} ({resultados[mas_rapido]:.2f}s)") # Imprimimos cuál fue el modo más rápido y cuánto tiempo tardó.
+    mas_rapido = min(resultados, key=lambda nombre: resultados[nombre]['tiempo']) # Encontramos el nombre del modo que tardó menos tiempo.
+    logger.info("\nModo más rápido: %s (%.2fs)", mas_rapido, resultados[mas_rapido]['tiempo']) # Imprimimos cuál fue el modo más rápido y cuánto tiempo tardó.
+    return resultados # Devolvemos las medidas por si alguien quiere usarlas.
 
 def iniciar(): # Esta es la función principal que se encarga de empezar todo el proceso cuando ejecutamos el programa.
     """Función principal para manejo de línea de comandos.""" # Este comentario está bien.
+    import argparse # Esto nos permite que el programa reciba instrucciones cuando lo ejecutemos desde la terminal.
     informador = argparse.ArgumentParser( # Creamos una herramienta para poder recibir instrucciones del usuario cuando ejecute el programa desde la terminal.
         description="Obtiene datos de fotos y álbumes desde la API" # Le damos una descripción a esta herramienta para que el usuario sepa qué hace el programa.
     )
     informador.add_argument( # Añadimos una opción para que el usuario pueda indicar el modo de ejecución que quiere usar.
         '--modo', # El nombre de la opción será "--modo".
-        choices=['secuencial', 'hilos', 'procesos', 'comparar'], # Las opciones válidas para esta opción son 'secuencial', 'hilos', 'procesos' y 'comparar'.
+        choices=['secuencial', 'hilos', 'procesos', 'masivo', 'async', 'comparar'], # Las opciones válidas para esta opción son 'secuencial', 'hilos', 'procesos', 'masivo', 'async' y 'comparar'.
         required=True, # Esta opción es obligatoria, el usuario tiene que elegir un modo.
         help="Modo de ejecución a utilizar" # Le damos una ayuda al usuario explicando qué hace esta opción.
     )
@@ -150,41 +1150,134 @@ def iniciar(): # Esta es la función principal que se encarga de empezar todo el
         default='INFO', # Si el usuario no indica nada, el nivel de registro será INFO por defecto.
         help="Nivel de detalle del registro" # Explicamos qué hace esta opción.
     )
+    informador.add_argument( # Añadimos una opción para usar otra API con el mismo formato, por ejemplo el servidor simulado de servidor_simulado.py.
+        '--url-base',
+        default=URL_BASE,
+        help=f"Dirección base de la API (por defecto: {URL_BASE})"
+    )
+    informador.add_argument( # Añadimos una opción para elegir hasta dónde puede subir el limitador adaptativo (en procesos, cada proceso usa HILOS_POR_PROCESO).
+        '--max-concurrentes',
+        type=int,
+        default=MAX_CONCURRENTES,
+        help=f"Máximo de peticiones simultáneas del limitador adaptativo (por defecto: {MAX_CONCURRENTES})"
+    )
+    informador.add_argument( # Añadimos una opción para elegir cuántas peticiones simultáneas hace el modo async.
+        '--concurrencia',
+        type=int,
+        default=CONCURRENCIA_ASYNC,
+        help=f"Peticiones simultáneas en modo async (por defecto: {CONCURRENCIA_ASYNC})"
+    )
+    informador.add_argument( # Añadimos una opción para elegir cuántos álbumes puede recordar la caché.
+        '--cache-albumes',
+        type=int,
+        default=TAMANO_CACHE_ALBUMES, # Por defecto caben todos los álbumes de la API.
+        help="Número máximo de álbumes en caché (0 la desactiva)"
+    )
+    informador.add_argument( # Añadimos una opción para elegir cuánto tiempo dura cada álbum en la caché.
+        '--ttl-cache',
+        type=float,
+        default=TTL_CACHE_ALBUMES,
+        help="Segundos que un álbum permanece válido en caché"
+    )
+    informador.add_argument( # Añadimos una opción para guardar los resultados en un archivo según van llegando.
+        '--salida',
+        help="Archivo donde escribir los resultados: .csv para CSV, cualquier otra extensión para NDJSON"
+    )
+    informador.add_argument( # Añadimos una opción para apuntar el progreso en un archivo.
+        '--progreso',
+        help="Base de datos SQLite donde guardar el progreso de la ejecución"
+    )
+    informador.add_argument( # Y otra para continuar desde donde se quedó una ejecución anterior.
+        '--reanudar',
+        action='store_true',
+        help="Procesa solo las fotos que faltan en --progreso o que terminaron con error"
+    )
+    informador.add_argument( # Añadimos una opción para ver el avance en vivo mientras se ejecuta.
+        '--en-vivo',
+        action='store_true',
+        help="Muestra una línea de progreso con el ritmo, los errores y el p95 de latencia"
+    )
+    informador.add_argument( # Y otra para guardar las métricas al terminar, en el formato de Prometheus.
+        '--metricas',
+        help="Archivo donde escribir las métricas finales en formato de texto de Prometheus"
+    )
     argumentos = informador.parse_args() # Aquí le pedimos a la herramienta que revise las instrucciones que el usuario dio al ejecutar el programa.
 
-    # Configurar nivel de logging
-    logger.setLevel(argumentos.nivel_log) # Establecemos el nivel de detalle del registro según lo que haya indicado el usuario (o el valor por defecto).
+    # Configurar el logging
+    configurar_logging(argumentos.nivel_log) # Solo aquí decidimos adónde van los mensajes, con el nivel de detalle que haya indicado el usuario (o el valor por defecto).
 
     # Validar número de fotos
     if argumentos.fotos and argumentos.fotos <= 0: # Verificamos si el usuario indicó un número de fotos y si ese número es menor o igual a cero.
         logger.error("La cantidad de fotos debe ser un número positivo") # Si no es un número positivo, guardamos un mensaje de error en el registro.
         sys.exit(1) # Y terminamos el programa con un código de error (1).
+    if argumentos.concurrencia <= 0 or argumentos.max_concurrentes <= 0: # La concurrencia también tiene que ser positiva.
+        logger.error("La concurrencia debe ser un número positivo")
+        sys.exit(1)
+    if argumentos.reanudar and not argumentos.progreso: # Para reanudar necesitamos saber dónde está guardado el progreso.
+        logger.error("--reanudar necesita indicar el archivo con --progreso")
+        sys.exit(1)
 
-    obtenedor = ObtenedorFotos() # Creamos un objeto de la clase ObtenedorFotos, que nos ayudará a obtener la información de las fotos.
-    limite = argumentos.fotos or obtener_total_fotos(obtenedor) # Aquí decidimos cuántas fotos vamos a procesar. Si el usuario indicó un número con la opción "--fotos", usamos ese número. Si no, intentamos obtener el número total de fotos de la página web.
+    obtenedor = ObtenedorFotos(argumentos.cache_albumes, argumentos.ttl_cache, argumentos.max_concurrentes, argumentos.url_base) # Creamos un objeto de la clase ObtenedorFotos, que nos ayudará a obtener la información de las fotos.
+    if argumentos.modo == 'masivo' and not argumentos.reanudar: # El modo masivo ya descarga la lista de fotos, así que no hace falta preguntar antes cuántas hay (salvo para saber cuáles faltan al reanudar).
+        limite = argumentos.fotos # Si no se indicó nada, será None y se procesarán todas.
+    else:
+        limite = argumentos.fotos or obtener_total_fotos(obtenedor) # Aquí decidimos cuántas fotos vamos a procesar. Si el usuario indicó un número con la opción "--fotos", usamos ese número. Si no, intentamos obtener el número total de fotos de la página web.
 
     if argumentos.modo == 'comparar': # Si el usuario eligió el modo "comparar".
         comparar_modos(obtenedor, min(limite, 100))  # Límite para comparativas. Ejecutamos la función para comparar los modos, pero limitamos el número de fotos a 100 para que no tarde demasiado.
-    else: # Si el usuario eligió otro modo (secuencial, hilos o procesos).
-        modos = { # Creamos un diccionario con los modos y las funciones correspondientes.
-            'secuencial': ejecutar_secuencial,
-            'hilos': ejecutar_con_hilos,
-            'procesos': ejecutar_con_procesos
+    else: # Si el usuario eligió otro modo (secuencial, hilos, procesos, masivo o async).
+        flujos = { # Creamos un diccionario con los modos y las funciones que producen su flujo de resultados.
+            'secuencial': iterar_secuencial,
+            'hilos': iterar_con_hilos,
+            'procesos': iterar_con_procesos,
+            'masivo': iterar_masivo,
+            'async': lambda obtenedor, limite, ids_fotos: iterar_async(obtenedor, limite, argumentos.concurrencia, ids_fotos) # El modo async además necesita saber la concurrencia elegida.
         }
-        resultados, tiempo = modos[argumentos.modo](obtenedor, limite) # Obtenemos la función correspondiente al modo elegido por el usuario y la ejecutamos para el límite de fotos indicado. Guardamos los resultados y el tiempo que tardó.
+        with AlmacenProgreso(argumentos.progreso) if argumentos.progreso else nullcontext() as almacen: # Si el usuario pidió guardar el progreso, abrimos el almacén.
+            ids_fotos = None # Por defecto procesamos de la 1 al límite.
+            if argumentos.reanudar: # Al reanudar, solo pedimos las fotos que faltan o que fallaron la otra vez.
+                ids_fotos = almacen.pendientes(limite)
+                logger.info("Reanudando: %d fotos ya completadas, %d pendientes", limite - len(ids_fotos), len(ids_fotos))
+
+            inicio = time.perf_counter() # Medimos el tiempo justo antes de empezar.
+            exitos = errores = 0 # Si no queda nada pendiente, no hay nada que contar.
+            with abrir_escritor(argumentos.salida) if argumentos.salida else nullcontext() as escritor: # Si el usuario pidió un archivo de salida, lo abrimos; si no, no escribimos nada.
+                if escritor is not None and argumentos.reanudar: # El archivo se escribe de nuevo, así que primero van las fotos que ya se obtuvieron en ejecuciones anteriores.
+                    for registro in almacen.completados(limite):
+                        escritor.escribir(registro)
+                if ids_fotos is None or ids_fotos: # Solo arrancamos el modo elegido si hay algo que hacer.
+                    flujo = flujos[argumentos.modo](obtenedor, limite, ids_fotos=ids_fotos) # Preparamos el flujo del modo elegido; los resultados irán llegando uno a uno.
+                    if almacen is not None: # Si hay almacén, cada resultado se apunta en él según pasa.
+                        flujo = almacen.registrar(flujo)
+                    if argumentos.en_vivo: # Si el usuario lo pidió, mostramos el avance según pasan los resultados.
+                        flujo = con_progreso(flujo, len(ids_fotos) if ids_fotos is not None else limite, obtenedor.metricas)
+                    exitos, errores = consumir_resultados(flujo, escritor) # Recorremos el flujo escribiendo y contando, sin guardar los resultados en memoria.
+        tiempo = time.perf_counter() - inicio # Calculamos cuánto tardó todo.
 
         # Mostrar resumen final
-        exitos = sum(1 for r in resultados if 'error' not in r) # Contamos cuántas fotos se procesaron correctamente (es decir, cuántos resultados no tienen la etiqueta 'error').
         logger.info( # Guardamos un mensaje en el registro con un resumen de lo que pasó.
-            f"\nProceso completado: {exitos} correctos, " # Indicamos cuántas fotos se obtuvieron correctamente.
-            f"{len(resultados)-exitos} errores\n" # Indicamos cuántas fotos tuvieron algún error.
-            f"Tiempo total: {tiempo:.2f} segundos" # Indicamos cuánto tiempo tardó todo el proceso.
+            "\nProceso completado: %d correctos, %d errores\nTiempo total: %.2f segundos", # Indicamos cuántas fotos se obtuvieron correctamente, cuántas tuvieron algún error y cuánto tiempo tardó todo el proceso.
+            exitos, errores, tiempo
         )
+        if argumentos.modo != 'procesos': # En modo procesos cada trabajador tiene su propia caché y su propio limitador; los del proceso principal no se usan.
+            estadisticas = obtenedor.cache_albumes.estadisticas() # Pedimos a la caché sus contadores.
+            logger.info( # Y mostramos cuántas peticiones de álbumes nos hemos ahorrado.
+                "Caché de álbumes: %d aciertos, %d fallos, %d agrupadas",
+                estadisticas['aciertos'], estadisticas['fallos'], estadisticas['agrupadas']
+            )
+            logger.info( # Y hasta dónde llegó el limitador adaptativo.
+                "Concurrencia final: %d (%d reducciones)",
+                obtenedor.limitador.limite, obtenedor.limitador.reducciones
+            )
+        mostrar_metricas(obtenedor.metricas) # Y dónde se fue el tiempo de las peticiones.
+        if argumentos.metricas: # Si el usuario lo pidió, guardamos las métricas para Prometheus.
+            with open(argumentos.metricas, 'w', encoding='utf-8') as archivo:
+                archivo.write(obtenedor.metricas.prometheus())
+            logger.info("Métricas guardadas en %s", argumentos.metricas)
 
 if __name__ == '__main__': # Esta línea se asegura de que la función "iniciar" se ejecute solo cuando ejecutamos este archivo directamente (no cuando lo importamos desde otro archivo).
     try: # Intentamos ejecutar la función "iniciar".
-        selector_de_fotos = ObtenedorFotos()
-        selector_de_fotos.iniciar()
+        iniciar()
     except KeyboardInterrupt: # Si el usuario presiona Ctrl+C para interrumpir el programa.
         logger.info("\nEjecución interrumpida por el usuario") # Guardamos un mensaje en el registro indicando que el usuario interrumpió el programa.
         sys.exit(0) # Terminamos el programa de forma normal (con código 0).
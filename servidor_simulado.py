@@ -0,0 +1,159 @@
+import json # Para convertir las fotos y los álbumes a texto JSON, como hace la API de verdad.
+import random # Para simular latencias variables y errores al azar.
+import sys # Para saber qué error se produjo al atender una conexión.
+import threading # El servidor atiende en un hilo aparte para no bloquear el programa que lo usa.
+import time # Para simular la latencia del servidor.
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer # Un servidor web sencillo que viene con Python y atiende cada conexión en su propio hilo.
+from urllib.parse import parse_qs, urlsplit # Para entender la dirección y los parámetros (?_start=0&_limit=10) de cada petición.
+
+FOTOS_SIMULADAS = 5000  # Igual que JSONPlaceholder: 5000 fotos...
+FOTOS_POR_ALBUM = 50  # ...repartidas en álbumes de 50 (100 álbumes en total).
+ESTADOS_ERROR = (429, 500, 503)  # Códigos con los que responde el servidor cuando simula un fallo.
+
+class ServidorSimulado: # Un sustituto local de JSONPlaceholder, para probar y medir el programa sin depender de internet.
+    """Servidor HTTP local que imita /photos y /albums de JSONPlaceholder."""
+
+    def __init__(self, fotos=FOTOS_SIMULADAS, fotos_por_album=FOTOS_POR_ALBUM, latencia=0.0, variacion=0.0, tasa_errores=0.0, semilla=None, puerto=0): # Al crearlo decidimos cuántos datos tiene y cómo de lento y de fiable es.
+        self.latencia = latencia # Segundos que tarda en responder cada petición.
+        self.variacion = variacion # Cuánto puede variar esa latencia, hacia arriba o hacia abajo.
+        self.tasa_errores = tasa_errores # Fracción de peticiones (0.0 a 1.0) que fallan con 429, 500 o 503.
+        self.peticiones = [] # Las direcciones pedidas, en orden, para poder comprobarlas en las pruebas.
+        self._azar = random.Random(semilla) # Un generador de azar propio, para poder repetir exactamente la misma simulación.
+        self._cerrojo = threading.Lock() # Varios hilos del servidor usan el azar y la lista de peticiones a la vez.
+        self._fotos = [ # Generamos las fotos con la misma forma que las de JSONPlaceholder.
+            {
+                'albumId': (i - 1) // fotos_por_album + 1,
+                'id': i,
+                'title': f"foto simulada {i}",
+                'url': f"https://via.placeholder.com/600/{i:06x}",
+                'thumbnailUrl': f"https://via.placeholder.com/150/{i:06x}"
+            }
+            for i in range(1, fotos + 1)
+        ]
+        self._albumes = [ # Y los álbumes, uno por cada grupo de fotos.
+            {'userId': (i - 1) // 10 + 1, 'id': i, 'title': f"album simulado {i}"}
+            for i in range(1, (fotos - 1) // fotos_por_album + 2)
+        ] if fotos else []
+        self._servidor = _ServidorHilos(('127.0.0.1', puerto), _crear_manejador(self)) # Creamos el servidor; con puerto 0, el sistema elige uno libre.
+        self._hilo = None
+
+    @property
+    def url_base(self): # La dirección que hay que pasar a ObtenedorFotos(url_base=...) para usar este servidor.
+        host, puerto = self._servidor.server_address
+        return f"http://{host}:{puerto}"
+
+    def iniciar(self): # Arranca el servidor en un hilo aparte.
+        """Empieza a atender peticiones en segundo plano."""
+        self._hilo = threading.Thread(target=self._servidor.serve_forever, daemon=True)
+        self._hilo.start()
+        return self
+
+    def detener(self): # Para el servidor y libera el puerto.
+        """Deja de atender peticiones y cierra el puerto."""
+        self._servidor.shutdown()
+        self._servidor.server_close()
+
+    def __enter__(self): # Permite usarlo con "with": se arranca al entrar...
+        return self.iniciar()
+
+    def __exit__(self, *detalles_error): # ...y se detiene al salir.
+        self.detener()
+
+    def responder(self, ruta): # Decide qué responder a una petición: devuelve el código HTTP, el contenido y las cabeceras extra.
+        """Devuelve el estado, el cuerpo y las cabeceras para la ruta pedida."""
+        with self._cerrojo:
+            self.peticiones.append(ruta)
+            espera = max(0.0, self.latencia + self._azar.uniform(-self.variacion, self.variacion)) # La latencia de esta petición.
+            falla = self._azar.random() < self.tasa_errores # ¿Simulamos un fallo en esta?
+            estado_error = self._azar.choice(ESTADOS_ERROR)
+        if espera: # Simulamos lo que tarda el servidor de verdad.
+            time.sleep(espera)
+        if falla:
+            return estado_error, {}, ({'Retry-After': '0'} if estado_error == 429 else {}) # A los 429 les añadimos Retry-After, como hacen las API reales.
+
+        partes = urlsplit(ruta)
+        recurso, _, id_texto = partes.path.strip('/').partition('/') # Por ejemplo, "photos/7" -> ("photos", "7").
+        datos = {'photos': self._fotos, 'albums': self._albumes}.get(recurso)
+        if datos is None: # Un recurso que no existe.
+            return 404, {}, {}
+        if id_texto: # Un elemento concreto, como /photos/7.
+            elemento = _buscar(datos, id_texto)
+            return (200, elemento, {}) if elemento is not None else (404, {}, {})
+        return 200, _filtrar(datos, parse_qs(partes.query)), {} # Una lista, con los filtros que admita JSONPlaceholder.
+
+class _ServidorHilos(ThreadingHTTPServer): # El servidor de Python, ajustado para aguantar cientos de conexiones a la vez.
+    request_queue_size = 1024 # Por defecto solo deja 5 conexiones esperando; con más, el sistema las rechaza y el cliente tarda un segundo en reintentar.
+    daemon_threads = True # Los hilos del servidor no impiden que el programa termine.
+
+    def handle_error(self, request, client_address): # Que el cliente cierre la conexión a medias es normal (reintentos, cancelaciones); no llenamos la terminal de trazas por eso.
+        if isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            return
+        super().handle_error(request, client_address)
+
+def _buscar(datos, id_texto): # Busca un elemento por su ID. Los IDs son consecutivos desde 1, así que basta con su posición.
+    if not id_texto.isdigit() or not 1 <= int(id_texto) <= len(datos):
+        return None
+    return datos[int(id_texto) - 1]
+
+def _filtrar(datos, parametros): # Aplica los filtros de JSONPlaceholder: por campo (id=1&id=2, albumId=3) y por rango (_start, _end, _limit).
+    inicio = int(parametros.pop('_start', ['0'])[0])
+    fin = parametros.pop('_end', [None])[0]
+    cantidad = parametros.pop('_limit', [None])[0]
+    for campo, valores in parametros.items(): # Cada campo puede repetirse: id=1&id=2 significa "id 1 o id 2".
+        datos = [d for d in datos if str(d.get(campo)) in valores]
+    if cantidad is not None:
+        fin = inicio + int(cantidad)
+    return datos[inicio:int(fin) if fin is not None else None]
+
+def _crear_manejador(simulado): # Crea la clase que atiende cada petición, conectada a nuestro servidor simulado.
+    class Manejador(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1' # Con HTTP/1.1 las conexiones se reutilizan (keep-alive), igual que en la API de verdad.
+        disable_nagle_algorithm = True # Cabeceras y cuerpo van en dos escrituras; con el algoritmo de Nagle, la segunda esperaría ~40 ms al ACK retardado del cliente en cada conexión reutilizada.
+
+        def do_GET(self): # Se llama con cada petición GET.
+            estado, contenido, cabeceras = simulado.responder(self.path)
+            cuerpo = json.dumps(contenido).encode()
+            self.send_response(estado)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(cuerpo))) # Imprescindible para que el cliente sepa dónde acaba la respuesta y pueda reutilizar la conexión.
+            for nombre, valor in cabeceras.items():
+                self.send_header(nombre, valor)
+            self.end_headers()
+            self.wfile.write(cuerpo)
+
+        def log_message(self, *args): # No queremos una línea en la terminal por cada petición.
+            pass
+
+    return Manejador
+
+def iniciar(): # Arranca el servidor simulado desde la terminal, para usarlo con obtenedor_fotos.py --url-base.
+    """Función principal para manejo de línea de comandos."""
+    import argparse # Solo hace falta al ejecutarlo desde la terminal.
+    informador = argparse.ArgumentParser(description="Servidor local que imita /photos y /albums de JSONPlaceholder")
+    informador.add_argument('--puerto', type=int, default=8000, help="Puerto donde escuchar (0 para uno libre)")
+    informador.add_argument('--fotos', type=int, default=FOTOS_SIMULADAS, help="Número de fotos simuladas")
+    informador.add_argument('--latencia', type=float, default=0.0, help="Latencia simulada por petición, en segundos")
+    informador.add_argument('--variacion', type=float, default=0.0, help="Variación máxima de la latencia simulada, en segundos")
+    informador.add_argument('--tasa-errores', type=float, default=0.0, help="Fracción de peticiones que fallan con 429/500/503")
+    informador.add_argument('--semilla', type=int, help="Semilla del azar, para repetir la misma simulación")
+    argumentos = informador.parse_args()
+
+    servidor = ServidorSimulado(
+        fotos=argumentos.fotos,
+        latencia=argumentos.latencia,
+        variacion=argumentos.variacion,
+        tasa_errores=argumentos.tasa_errores,
+        semilla=argumentos.semilla,
+        puerto=argumentos.puerto
+    ).iniciar()
+    print(f"Servidor simulado en {servidor.url_base} (Ctrl+C para parar)", flush=True)
+    try:
+        while True: # El servidor atiende en su hilo; aquí solo esperamos a que el usuario lo pare.
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.detener()
+
+if __name__ == '__main__':
+    iniciar()
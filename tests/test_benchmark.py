@@ -0,0 +1,45 @@
+import json
+import statistics
+import time
+
+import requests
+from benchmark import ejecutar_matriz, exportar_json
+from servidor_simulado import ServidorSimulado
+
+def test_servidor_simulado_filtra_como_jsonplaceholder():
+    with ServidorSimulado(fotos=120) as servidor:
+        fotos = requests.get(f"{servidor.url_base}/photos", params={'_start': 10, '_limit': 5}).json()
+        albumes = requests.get(f"{servidor.url_base}/albums", params={'id': [2, 3]}).json()
+        inexistente = requests.get(f"{servidor.url_base}/photos/121")
+    assert [f['id'] for f in fotos] == [11, 12, 13, 14, 15]
+    assert [a['id'] for a in albumes] == [2, 3]
+    assert inexistente.status_code == 404
+
+def test_servidor_simulado_reutiliza_conexiones_sin_esperas_extra():
+    with ServidorSimulado(fotos=10, latencia=0.01) as servidor, requests.Session() as sesion:
+        tiempos = []
+        for id_foto in range(1, 11): # Todas por la misma conexión (keep-alive).
+            inicio = time.perf_counter()
+            sesion.get(f"{servidor.url_base}/photos/{id_foto}").raise_for_status()
+            tiempos.append(time.perf_counter() - inicio)
+    assert statistics.median(tiempos) < 0.01 + 0.02 # Con Nagle activado serían ~50 ms.
+
+def test_servidor_simulado_inyecta_errores():
+    with ServidorSimulado(fotos=10, tasa_errores=1.0, semilla=1) as servidor:
+        respuesta = requests.get(f"{servidor.url_base}/photos/1")
+    assert respuesta.status_code in (429, 500, 503)
+
+def test_ejecutar_matriz_exporta_json(tmp_path):
+    with ServidorSimulado(fotos=20) as servidor:
+        casos = ejecutar_matriz(
+            servidor.url_base, motores=['secuencial', 'hilos'], tamanos=[10],
+            concurrencias=[2, 4], calentamiento=0, repeticiones=1
+        )
+    assert [(c['motor'], c['concurrencia']) for c in casos] == [
+        ('secuencial', None), ('hilos', 2), ('hilos', 4)
+    ]
+    assert all(c['errores'] == 0 and c['fotos_por_segundo'] > 0 for c in casos)
+    ruta = tmp_path / 'benchmark.json'
+    exportar_json(casos, str(ruta), {'tamanos': [10]})
+    informe = json.loads(ruta.read_text(encoding='utf-8'))
+    assert len(informe['casos']) == 3
@@ -1,13 +1,375 @@
+import csv
+import io
+import json
+import os
+import pickle
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
 import pytest
-from obtenedor_fotos import ObtenedorFotos
+import requests
+import obtenedor_fotos
+from obtenedor_fotos import (
+    ESPERA_BASE, ESPERA_MAXIMA, AlmacenProgreso, CacheAlbumes,
+    LimitadorAdaptativo, Metricas, ObtenedorFotos, _calcular_espera,
+    _detener_logging, abrir_escritor, comparar_modos, con_progreso,
+    configurar_logging, consumir_resultados, ejecutar_async,
+    ejecutar_con_procesos, ejecutar_masivo, iterar_async, iterar_con_hilos,
+    iterar_con_procesos, iterar_secuencial
+)
+from servidor_simulado import ServidorSimulado
 
-def test_obtener_foto_existente():
-    obtenedor = ObtenedorFotos()
+@pytest.fixture
+def api():
+    with ServidorSimulado(fotos=6, fotos_por_album=2) as servidor:
+        yield servidor
+
+def test_obtener_foto_existente(api):
+    obtenedor = ObtenedorFotos(url_base=api.url_base)
     resultado = obtenedor.obtener_datos_foto(1)
     assert resultado['id'] == 1
     assert 'error' not in resultado
 
-def test_obtener_foto_inexistente():
-    obtenedor = ObtenedorFotos()
+def test_obtener_foto_inexistente(api):
+    obtenedor = ObtenedorFotos(url_base=api.url_base)
     resultado = obtenedor.obtener_datos_foto(99999)
-    assert 'error' in resultado
\ No newline at end of file
+    assert 'error' in resultado
+
+def test_cache_albumes_reutiliza_valor():
+    cache = CacheAlbumes()
+    llamadas = []
+    cargar = lambda clave: llamadas.append(clave) or {'id': clave}
+    assert cache.obtener(1, cargar) == {'id': 1}
+    assert cache.obtener(1, cargar) == {'id': 1}
+    assert llamadas == [1]
+    assert cache.estadisticas()['aciertos'] == 1
+    assert cache.estadisticas()['fallos'] == 1
+
+def test_cache_albumes_expulsa_el_menos_usado():
+    cache = CacheAlbumes(tamano_maximo=2)
+    for clave in (1, 2, 1, 3):
+        cache.obtener(clave, lambda c: {'id': c})
+    assert cache.estadisticas()['entradas'] == 2
+    assert cache.obtener(2, lambda c: 'recargado') == 'recargado'
+
+def test_cache_albumes_caduca_con_ttl():
+    cache = CacheAlbumes(ttl=0)
+    cache.obtener(1, lambda c: 'viejo')
+    assert cache.obtener(1, lambda c: 'nuevo') == 'nuevo'
+
+def test_cache_albumes_agrupa_peticiones_simultaneas():
+    cache = CacheAlbumes()
+    llamadas = []
+    def cargar(clave):
+        llamadas.append(clave)
+        time.sleep(0.1)
+        return {'id': clave}
+    with ThreadPoolExecutor(max_workers=50) as ejecutor:
+        resultados = list(ejecutor.map(lambda _: cache.obtener(7, cargar), range(50)))
+    assert llamadas == [7]
+    assert all(r == {'id': 7} for r in resultados)
+
+def test_cache_albumes_no_guarda_errores():
+    cache = CacheAlbumes()
+    def fallar(clave):
+        raise KeyError(clave)
+    with pytest.raises(KeyError):
+        cache.obtener(1, fallar)
+    assert cache.obtener(1, lambda c: 'ok') == 'ok'
+
+def test_obtenedor_se_puede_copiar_a_otro_proceso():
+    obtenedor = ObtenedorFotos()
+    obtenedor.cache_albumes.guardar(1, {'id': 1})
+    copia = pickle.loads(pickle.dumps(obtenedor))
+    assert copia.cache_albumes.obtener(1, lambda c: None) == {'id': 1}
+
+def test_obtener_datos_masivos_usa_dos_peticiones(api):
+    obtenedor = ObtenedorFotos(url_base=api.url_base)
+    resultados = obtenedor.obtener_datos_masivos(3)
+    assert api.peticiones == ['/photos?_start=0&_limit=3', '/albums?id=1&id=2']
+    assert resultados[2] == {
+        'id': 3, 'titulo': 'foto simulada 3', 'url': 'https://via.placeholder.com/600/000003',
+        'album': {'id': 2, 'titulo': 'album simulado 2'}
+    }
+
+def test_obtener_datos_masivos_marca_fotos_sin_album():
+    obtenedor = ObtenedorFotos()
+    fotos = [{'id': i, 'albumId': i, 'title': f"foto {i}", 'url': f"http://x/{i}"} for i in (1, 2)]
+    obtenedor._obtener_recurso = lambda url, parametros=None: (
+        fotos if url == obtenedor.url_fotos else [{'id': 1, 'title': 'album 1'}]
+    )
+    resultados = obtenedor.obtener_datos_masivos()
+    assert 'error' not in resultados[0]
+    assert 'error' in resultados[1]
+
+def test_ejecutar_masivo_completa_fotos_que_faltan(api):
+    obtenedor = ObtenedorFotos(url_base=api.url_base)
+    resultados, _ = ejecutar_masivo(obtenedor, 8)
+    assert [r['id'] for r in resultados] == list(range(1, 9))
+    assert 'error' in resultados[7]
+
+def test_ejecutar_masivo_sin_limite_marca_error_en_todas_si_falla(monkeypatch):
+    monkeypatch.setattr(obtenedor_fotos, 'ESPERA_BASE', 0.01)
+    monkeypatch.setattr(obtenedor_fotos, 'FOTOS_POR_DEFECTO', 5)
+    with ServidorSimulado(fotos=5, tasa_errores=1.0) as servidor:
+        resultados, _ = ejecutar_masivo(ObtenedorFotos(url_base=servidor.url_base))
+    assert [r['id'] for r in resultados] == [1, 2, 3, 4, 5]
+    assert all('error' in r for r in resultados)
+
+def test_ejecutar_async_agrupa_albumes(api):
+    obtenedor = ObtenedorFotos(url_base=api.url_base)
+    resultados, _ = ejecutar_async(obtenedor, 7, concurrencia=10)
+    assert sorted(r['id'] for r in resultados) == list(range(1, 8))
+    assert sum('error' in r for r in resultados) == 1
+    assert sorted(p for p in api.peticiones if p.startswith('/albums')) == [
+        '/albums/1', '/albums/2', '/albums/3'
+    ]
+
+def test_ejecutar_async_reintenta_errores_pasajeros(monkeypatch):
+    monkeypatch.setattr(obtenedor_fotos, 'ESPERA_BASE', 0.01)
+    with ServidorSimulado(fotos=40, fotos_por_album=5, tasa_errores=0.1, semilla=3) as servidor:
+        obtenedor = ObtenedorFotos(url_base=servidor.url_base)
+        resultados, _ = ejecutar_async(obtenedor, 40, concurrencia=8)
+    assert not [r for r in resultados if 'error' in r]
+    assert obtenedor.metricas.contador('reintentos') > 0
+
+def test_ejecutar_con_procesos_reparte_bloques(api):
+    obtenedor = ObtenedorFotos(url_base=api.url_base)
+    resultados, _ = ejecutar_con_procesos(obtenedor, 7, hilos_por_proceso=2)
+    assert sorted(r['id'] for r in resultados) == list(range(1, 8))
+    assert sum('error' in r for r in resultados) == 1
+
+def test_iterar_con_procesos_limita_el_tamano_de_los_bloques(api, monkeypatch):
+    monkeypatch.setattr(obtenedor_fotos, 'LOTE_MAXIMO', 1) # Muchos más bloques que los que caben en vuelo.
+    flujo = iterar_con_procesos(ObtenedorFotos(url_base=api.url_base), 6, hilos_por_proceso=1)
+    assert sorted(r['id'] for r in flujo) == list(range(1, 7))
+    flujo = iterar_con_procesos(ObtenedorFotos(url_base=api.url_base), 6, hilos_por_proceso=1)
+    next(flujo)
+    flujo.close() # Cerrar a medias no debe quedarse colgado.
+
+def test_iterar_con_hilos_entrega_todos_los_resultados(api):
+    obtenedor = ObtenedorFotos(url_base=api.url_base)
+    resultados = list(iterar_con_hilos(obtenedor, 7))
+    assert sorted(r['id'] for r in resultados) == list(range(1, 8))
+
+def test_iterar_async_se_puede_cerrar_a_medias(api):
+    flujo = iterar_async(ObtenedorFotos(url_base=api.url_base), 7, concurrencia=2)
+    assert 'id' in next(flujo)
+    flujo.close()
+
+def test_iterar_async_cerrado_a_medias_no_deja_albumes_en_curso():
+    with ServidorSimulado(fotos=40, fotos_por_album=2, latencia=0.01) as servidor:
+        obtenedor = ObtenedorFotos(url_base=servidor.url_base)
+        flujo = iterar_async(obtenedor, 40, concurrencia=40)
+        next(flujo)
+        flujo.close()
+        assert not obtenedor.cache_albumes._en_curso_async
+        resultados, _ = ejecutar_async(obtenedor, 40) # Con otro bucle de eventos.
+    assert not [r for r in resultados if 'error' in r]
+
+RESULTADOS_FALSOS = [
+    {'id': 1, 'titulo': 'foto 1', 'url': 'http://x/1', 'album': {'id': 1, 'titulo': 'album 1'}},
+    {'id': 2, 'error': '404'}
+]
+
+def test_consumir_resultados_escribe_ndjson(tmp_path):
+    ruta = str(tmp_path / 'salida.ndjson')
+    with abrir_escritor(ruta) as escritor:
+        assert consumir_resultados(iter(RESULTADOS_FALSOS), escritor) == (1, 1)
+    with open(ruta, encoding='utf-8') as archivo:
+        assert [json.loads(linea) for linea in archivo] == RESULTADOS_FALSOS
+
+def test_consumir_resultados_escribe_csv(tmp_path):
+    ruta = str(tmp_path / 'salida.csv')
+    with abrir_escritor(ruta) as escritor:
+        consumir_resultados(iter(RESULTADOS_FALSOS), escritor)
+    with open(ruta, encoding='utf-8', newline='') as archivo:
+        filas = list(csv.DictReader(archivo))
+    assert filas[0]['album_titulo'] == 'album 1'
+    assert filas[1]['error'] == '404'
+
+def test_almacen_progreso_reintenta_solo_errores_y_faltantes(tmp_path):
+    ruta = str(tmp_path / 'progreso.db')
+    with AlmacenProgreso(ruta) as almacen:
+        for resultado in almacen.registrar(iter(RESULTADOS_FALSOS)):
+            pass
+    with AlmacenProgreso(ruta) as almacen:
+        assert almacen.pendientes(4) == [2, 3, 4]
+        almacen.guardar({'id': 2, 'titulo': 'foto 2'})
+        assert almacen.pendientes(4) == [3, 4]
+
+def test_reanudar_con_salida_conserva_lo_obtenido_antes(tmp_path):
+    def ejecutar(servidor, *opciones):
+        subprocess.run(
+            [sys.executable, obtenedor_fotos.__file__, '--modo', 'secuencial', '--fotos', '6', '--url-base', servidor.url_base,
+             '--progreso', 'progreso.db', '--salida', 'salida.ndjson', *opciones],
+            cwd=tmp_path, check=True, capture_output=True
+        )
+    with ServidorSimulado(fotos=4, fotos_por_album=2) as servidor: # La primera vez, las fotos 5 y 6 fallan.
+        ejecutar(servidor)
+    with ServidorSimulado(fotos=6, fotos_por_album=2) as servidor:
+        ejecutar(servidor, '--reanudar')
+    registros = [json.loads(linea) for linea in (tmp_path / 'salida.ndjson').read_text(encoding='utf-8').splitlines()]
+    assert [r['id'] for r in registros] == [1, 2, 3, 4, 5, 6]
+    assert not [r for r in registros if 'error' in r]
+
+def test_iterar_secuencial_procesa_solo_ids_indicados(api):
+    resultados = list(iterar_secuencial(ObtenedorFotos(url_base=api.url_base), 7, ids_fotos=[2, 5]))
+    assert [r['id'] for r in resultados] == [2, 5]
+    assert api.peticiones[0] == '/photos/2'
+
+def test_limitador_sube_con_exitos_y_baja_con_sobrecarga():
+    limitador = LimitadorAdaptativo(maximo=20, inicial=4)
+    for _ in range(10):
+        limitador.adquirir()
+        limitador.liberar(0.01)
+    assert limitador.limite == 14
+    limitador.adquirir()
+    limitador.liberar(0.01, sobrecarga=True)
+    assert limitador.limite == 7
+    assert limitador.reducciones == 1
+
+def test_limitador_no_deja_pasar_del_limite():
+    limitador = LimitadorAdaptativo(maximo=2, inicial=2)
+    en_curso, maximo_visto = [], []
+    cerrojo = threading.Lock()
+    def peticion(_):
+        limitador.adquirir()
+        with cerrojo:
+            en_curso.append(1)
+            maximo_visto.append(len(en_curso))
+        time.sleep(0.01)
+        with cerrojo:
+            en_curso.pop()
+        limitador.liberar(0.01)
+    with ThreadPoolExecutor(max_workers=10) as ejecutor:
+        list(ejecutor.map(peticion, range(30)))
+    assert max(maximo_visto) == 2
+
+def test_calcular_espera_respeta_retry_after():
+    assert _calcular_espera(0, '3') == 3.0
+    assert _calcular_espera(0, '1000') == ESPERA_MAXIMA
+    assert 0 <= _calcular_espera(2) <= ESPERA_BASE * 4
+
+class _SesionFalsa:
+    def __init__(self, estados):
+        self.estados = list(estados)
+        self.headers = {}
+
+    def get(self, url, params=None, timeout=None):
+        respuesta = requests.Response()
+        respuesta.status_code = self.estados.pop(0)
+        respuesta.headers['Retry-After'] = '0'
+        respuesta._content = b'{"id": 1}'
+        return respuesta
+
+def test_obtener_recurso_reintenta_errores_pasajeros():
+    obtenedor = ObtenedorFotos()
+    obtenedor.sesion = _SesionFalsa([503, 429, 200])
+    assert obtenedor._obtener_recurso('http://x/photos/1') == {'id': 1}
+    assert obtenedor.limitador.reducciones == 1
+    assert obtenedor.metricas.contador('reintentos', 'photos') == 2
+
+def test_obtener_recurso_no_reintenta_404():
+    obtenedor = ObtenedorFotos()
+    obtenedor.sesion = _SesionFalsa([404, 200])
+    with pytest.raises(requests.HTTPError):
+        obtenedor._obtener_recurso('http://x/photos/1')
+    assert obtenedor.sesion.estados == [200]
+
+def test_metricas_calculan_percentiles_por_endpoint():
+    metricas = Metricas()
+    for milisegundos in range(1, 101):
+        metricas.registrar('photos', milisegundos / 1000, 200)
+    metricas.registrar('albums', 5.0, 'error')
+    assert metricas.total() == 101
+    assert metricas.errores() == 1
+    assert metricas.percentil(0.5, 'photos') == pytest.approx(0.050, rel=0.25)
+    assert metricas.percentil(0.99, 'albums') == pytest.approx(5.0, rel=0.25)
+
+def test_metricas_se_combinan_entre_procesos():
+    origen = Metricas()
+    origen.registrar('photos', 0.01, 200)
+    destino = Metricas()
+    destino.combinar(pickle.loads(pickle.dumps(origen.extraer())))
+    assert destino.total('photos') == 1
+    assert origen.total() == 0
+
+def test_procesos_envian_sus_metricas(api):
+    obtenedor = ObtenedorFotos(url_base=api.url_base)
+    ejecutar_con_procesos(obtenedor, 4, hilos_por_proceso=2)
+    assert obtenedor.metricas.total('photos') == 4
+
+def test_comparar_modos_mide_todos_los_modos(api):
+    resultados = comparar_modos(ObtenedorFotos(url_base=api.url_base), 6)
+    assert len(resultados) == 5
+    assert all(medida['errores'] == 0 for medida in resultados.values())
+
+def test_metricas_cuentan_conexiones_reutilizadas(api):
+    obtenedor = ObtenedorFotos(url_base=api.url_base)
+    list(iterar_secuencial(obtenedor, 4))
+    resumen = obtenedor.metricas.resumen()
+    assert resumen['conexiones'] == {'nuevas': 1, 'reutilizadas': resumen['peticiones'] - 1, 'fallidas': 0}
+    assert resumen['bytes'] > 0
+    assert {'conexion', 'respuesta', 'json'} <= set(resumen['fases'])
+
+def test_metricas_no_cuentan_como_reutilizadas_las_conexiones_fallidas(monkeypatch):
+    monkeypatch.setattr(obtenedor_fotos, 'ESPERA_BASE', 0.01)
+    with socket.socket() as libre: # Un puerto que nadie escucha.
+        libre.bind(('127.0.0.1', 0))
+        puerto = libre.getsockname()[1]
+    obtenedor = ObtenedorFotos(url_base=f"http://127.0.0.1:{puerto}")
+    assert 'error' in obtenedor.obtener_datos_foto(1)
+    conexiones = obtenedor.metricas.resumen()['conexiones']
+    assert conexiones['nuevas'] == conexiones['reutilizadas'] == 0
+    assert conexiones['fallidas'] > 0
+
+def test_metricas_async_miden_fases_y_conexiones(api):
+    obtenedor = ObtenedorFotos(url_base=api.url_base)
+    ejecutar_async(obtenedor, 6, concurrencia=2)
+    resumen = obtenedor.metricas.resumen()
+    assert 1 <= resumen['conexiones']['nuevas'] <= 2
+    assert {'conexion', 'respuesta', 'json'} <= set(resumen['fases'])
+
+def test_metricas_se_exportan_en_formato_prometheus():
+    metricas = Metricas()
+    metricas.registrar('photos', 0.01, 200, bytes_recibidos=100)
+    metricas.registrar_fase('json', 0.001)
+    texto = metricas.prometheus()
+    assert 'obtenedor_fotos_peticiones_total{endpoint="photos",estado="200"} 1' in texto
+    assert 'obtenedor_fotos_bytes_total{endpoint="photos"} 100' in texto
+    assert 'obtenedor_fotos_latencia_segundos_count{endpoint="photos"} 1' in texto
+    assert 'obtenedor_fotos_fase_segundos_bucket{fase="json",le="+Inf"} 1' in texto
+
+def test_con_progreso_deja_pasar_resultados_y_muestra_avance():
+    salida = io.StringIO()
+    resultados = [{'id': 1}, {'id': 2, 'error': 'x'}]
+    assert list(con_progreso(resultados, 2, Metricas(), salida, intervalo=0)) == resultados
+    assert salida.getvalue().endswith('\n')
+    assert '2/2 (100.0%)' in salida.getvalue()
+    assert '1 errores' in salida.getvalue()
+
+def test_importar_no_configura_logging_ni_carga_motores(tmp_path):
+    codigo = (
+        "import logging, sys, obtenedor_fotos\n"
+        "assert not logging.getLogger().handlers\n"
+        "cargados = {'multiprocessing', 'concurrent.futures.thread', 'asyncio', 'sqlite3', 'aiohttp'} & set(sys.modules)\n"
+        "assert not cargados, cargados\n"
+    )
+    entorno = {**os.environ, 'PYTHONPATH': str(Path(obtenedor_fotos.__file__).parent)}
+    subprocess.run([sys.executable, '-c', codigo], cwd=tmp_path, env=entorno, check=True)
+    assert not list(tmp_path.iterdir())
+
+def test_configurar_logging_escribe_desde_la_cola(tmp_path):
+    archivo = tmp_path / 'registro.log'
+    configurar_logging('DEBUG', archivo=str(archivo))
+    try:
+        obtenedor_fotos.logger.debug("Reintentando %s", 'photos/1')
+    finally:
+        _detener_logging()
+    assert 'DEBUG - Reintentando photos/1' in archivo.read_text(encoding='utf-8')